@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time taken to find the nodes at a batch of addresses of a synthetic memory
+map, by checking every node for each address as ``--addr`` did, and from
+the address index of the map.
+
+The map is that of ``bench_node_memory.py``, and the addresses are spread
+over its ``.text`` section. Only a sample of the addresses are looked up
+by scanning the nodes, and the time for all of them is extrapolated from
+it. The time for the index includes building it.
+
+Run from the repository root :
+
+    python benchmarks/bench_address_lookup.py [NODES] [ADDRESSES]
+
+NODES defaults to 100000, and ADDRESSES to 10000.
+"""
+
+from __future__ import print_function
+
+import random
+import sys
+import time
+
+from bench_node_memory import build_map
+
+
+def _scan(mm, address):
+    return [n for n in mm.root.all_nodes() if n.contains_address(address)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    naddresses = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    mm = build_map(count)
+    text = mm.get_node('.text')
+    random.seed(0)
+    addresses = [random.randrange(text._address, text._address + text.size)
+                 for _ in range(naddresses)]
+    sample = addresses[:10]
+    print("{0} nodes, {1} addresses".format(
+        len(mm.root.all_nodes()), len(addresses)))
+
+    start = time.time()
+    expected = [_scan(mm, x)[-1] for x in sample]
+    elapsed = (time.time() - start) * len(addresses) / len(sample)
+    print("{0:>24} {1:>8.2f}s".format('nodes', elapsed))
+
+    start = time.time()
+    found = mm.address_index.lookup_many(addresses)
+    print("{0:>24} {1:>8.2f}s".format('index', time.time() - start))
+    assert found[:len(sample)] == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Per-name cost of ``LinkAliases.encode`` with its prefix trie, against the
+linear scan over all registered aliases it replaced, as the number of
+aliases grows.
+
+The aliases mimic a linker script which places the code of each module in
+an output section of its own with ``*(.text.module_NNN*)``. Half of the
+names looked up are symbols of those modules, and half are names which no
+alias matches.
+
+Run from the repository root :
+
+    python benchmarks/bench_aliases.py
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from fpvgcc.gccMemoryMap import LinkAliases
+
+
+def encode_linear(aliases, name):
+    for key in aliases.keys():
+        if name.startswith(key):
+            return aliases[key] + name
+    return name
+
+
+def _build(count):
+    aliases = LinkAliases()
+    for idx in range(count):
+        aliases.register_alias('.module_{0:03d}'.format(idx),
+                               '.text.module_{0:03d}'.format(idx))
+    names = []
+    for idx in range(0, count, max(count // 100, 1)):
+        names.append('.text.module_{0:03d}_function_name'.format(idx))
+        names.append('.rodata.string_table_{0:03d}'.format(idx))
+    return aliases, names
+
+
+def _per_name(func, names, repeat=5):
+    def run():
+        for name in names:
+            func(name)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(names)
+
+
+def main():
+    print("{0:>8} {1:>14} {2:>14} {3:>8}".format(
+        'ALIASES', 'LINEAR ns/name', 'TRIE ns/name', 'SPEEDUP'))
+    for count in (10, 100, 300, 1000):
+        aliases, names = _build(count)
+        table = dict(aliases.items())
+        linear = _per_name(lambda x: encode_linear(table, x), names)
+        trie = _per_name(aliases.encode, names)
+        print("{0:>8} {1:>14.1f} {2:>14.1f} {3:>7.1f}x".format(
+            count, linear * 1e9, trie * 1e9, linear / trie))
+
+
+if __name__ == '__main__':
+    main()
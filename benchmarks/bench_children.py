@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cost of building and searching an output section with many input
+sections, as the number of children of the section node grows.
+
+The section is built through ``GCCMemoryMap.get_node(create=True)``, as
+the parser does for each input section, and the time per child inserted
+is reported. Lookups of children by ident through the hash index are
+compared against the linear scan over the children it replaced, which
+is timed on a sample of idents only, since building a large section with
+it is quadratic.
+
+Run from the repository root :
+
+    python benchmarks/bench_children.py
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from fpvgcc.gccMemoryMap import GCCMemoryMap
+
+
+def get_child_linear(node, ident):
+    for child in node.children:
+        if child.ident == ident:
+            return child
+    raise ValueError
+
+
+def _names(count):
+    return ['.text._ZN6module{0}8functionEv'.format(idx).replace('.', '_')
+            for idx in range(count)]
+
+
+def _build(names):
+    mm = GCCMemoryMap(None)
+    for name in names:
+        mm.get_node('.text.' + name, create=True)
+    return mm
+
+
+def _per_call(func, args, repeat=3):
+    def run():
+        for arg in args:
+            func(arg)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(args)
+
+
+def main():
+    print("{0:>8} {1:>14} {2:>14} {3:>14} {4:>8}".format(
+        'CHILDREN', 'INSERT ns/node', 'LINEAR ns/get', 'INDEX ns/get',
+        'SPEEDUP'))
+    for count in (1000, 10000, 50000, 200000):
+        names = _names(count)
+        insert = _per_call(lambda x: _build(x), [names], repeat=1) / count
+        section = _build(names).get_node('.text')
+        sample = names[::max(count // 100, 1)]
+        linear = _per_call(lambda x: get_child_linear(section, x), sample)
+        index = _per_call(section.get_child_by_ident, sample)
+        print("{0:>8} {1:>14.1f} {2:>14.1f} {3:>14.1f} {4:>7.0f}x".format(
+            count, insert * 1e9, linear * 1e9, index * 1e9, linear / index))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time taken by the per object file and region footprint queries of
+``--sar``, over the nodes of a synthetic memory map and from its columnar
+table, with and without NumPy.
+
+The map is that of ``bench_node_memory.py``. Only a sample of the object
+files are queried over the nodes, as each query scans the whole map, and
+the time for all of them is extrapolated from it. The time for the
+columnar queries includes building the table.
+
+Run from the repository root :
+
+    python benchmarks/bench_columnar.py [NODES]
+
+NODES defaults to 100000.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from bench_node_memory import build_map
+from fpvgcc import columnar
+
+
+def _timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def _query(mm, objfiles, regions):
+    for objfile in objfiles:
+        for region in regions:
+            mm.get_objfile_fp_rgn(objfile, region)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    mm = build_map(count)
+    objfiles = mm.used_objfiles
+    regions = mm.used_regions
+    sample = objfiles[::max(len(objfiles) // 10, 1)]
+    print("{0} nodes, {1} object files".format(
+        len(mm.root.all_nodes()), len(objfiles)))
+
+    mm.columnar = False
+    nodes = _timed(lambda: _query(mm, sample, regions))
+    print("{0:>24} {1:>8.2f}s".format(
+        'nodes', nodes * len(objfiles) / len(sample)))
+
+    numpy = columnar.numpy
+    for name, module in (('columns, python', None),
+                         ('columns, numpy', numpy)):
+        if name.endswith('numpy') and numpy is None:
+            print("{0:>24} {1:>9}".format(name, 'n/a'))
+            continue
+        columnar.numpy = module
+        mm.columnar = True
+        mm._columns = None
+        elapsed = _timed(lambda: _query(mm, objfiles, regions))
+        print("{0:>24} {1:>8.2f}s".format(name, elapsed))
+    columnar.numpy = numpy
+
+
+if __name__ == '__main__':
+    main()
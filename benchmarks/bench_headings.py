@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Per-line cost of heading detection, comparing the combined heading regex
+with its first character fast path against trying each of the individual
+``re_headings`` regexes in turn.
+
+Run from the repository root :
+
+    python benchmarks/bench_headings.py [mapfile ...]
+"""
+
+from __future__ import print_function
+
+import glob
+import logging
+import sys
+import timeit
+
+from six import iteritems
+
+from fpvgcc.fpv import check_line_for_heading
+from fpvgcc.fpv import re_headings
+
+
+def check_line_for_heading_sequential(l):
+    for key, regex in iteritems(re_headings):
+        if regex.match(l):
+            return key
+    return None
+
+
+def _load_lines(fnames):
+    lines = []
+    for fname in fnames:
+        with open(fname) as f:
+            lines.extend(line for line in f if line.strip())
+    return lines
+
+
+def _per_line(func, lines, repeat=5):
+    def run():
+        for line in lines:
+            func(line)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(lines)
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    fnames = sys.argv[1:] or sorted(glob.glob('tests/maps/*.map'))
+    lines = _load_lines(fnames)
+    sequential = _per_line(check_line_for_heading_sequential, lines)
+    combined = _per_line(check_line_for_heading, lines)
+    print("Lines            : {0}".format(len(lines)))
+    print("Sequential regex : {0:8.1f} ns/line".format(sequential * 1e9))
+    print("Combined regex   : {0:8.1f} ns/line".format(combined * 1e9))
+    print("Saving           : {0:8.1f} ns/line ({1:.1f}x)"
+          "".format((sequential - combined) * 1e9, sequential / combined))
+
+
+if __name__ == '__main__':
+    main()
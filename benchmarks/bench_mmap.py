@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parse time of ``process_map_file`` reading the file as text and mmapped.
+
+Run from the repository root :
+
+    python benchmarks/bench_mmap.py [mapfile ...]
+"""
+
+from __future__ import print_function
+
+import glob
+import logging
+import sys
+import timeit
+
+from fpvgcc.fpv import process_map_file
+
+
+def _best(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    fnames = sys.argv[1:] or sorted(glob.glob('tests/maps/*.map'))
+    print("{0:<45}{1:>12}{2:>12}".format('MAPFILE', 'TEXT (ms)', 'MMAP (ms)'))
+    for fname in fnames:
+        text = _best(lambda: process_map_file(fname))
+        mmapped = _best(lambda: process_map_file(fname, use_mmap=True))
+        print("{0:<45}{1:>12.2f}{2:>12.2f}".format(
+            fname.split('/')[-1], text * 1e3, mmapped * 1e3))
+
+
+if __name__ == '__main__':
+    main()
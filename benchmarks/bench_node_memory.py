@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Memory used per node of a synthetic memory map, as traced by
+``tracemalloc``.
+
+The map is built through the node API the way the parser builds it, with
+output sections holding one node per object file, each of which holds
+the input sections generated for the functions and variables in it. The
+memory used by the strings of the map (names and file paths) is counted
+along with that of the nodes. As the parser does, each leaf is given its
+own copies of the file names. The regions of all the nodes are resolved,
+and their gidents built, as the footprint queries do. The time taken by a
+query over the file names of all the nodes is then reported.
+
+Run from the repository root :
+
+    python benchmarks/bench_node_memory.py [NODES]
+
+NODES defaults to 1000000.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import tracemalloc
+
+from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.gccMemoryMap import MemoryRegion
+from fpvgcc.profiles import get_profile
+
+
+SECTIONS = ('.text', '.rodata', '.data', '.bss')
+SYMBOLS_PER_OBJFILE = 50
+
+
+def _copy(value):
+    # A new string, as extracted from each line of a map file
+    return value.encode('utf-8').decode('utf-8')
+
+
+def build_map(count):
+    mm = GCCMemoryMap(get_profile('default'))
+    mm.memory_regions.append(
+        MemoryRegion('FLASH', '0x08000000', '0x10000000', 'xr')
+    )
+    mm.memory_regions.append(
+        MemoryRegion('RAM', '0x20000000', '0x10000000', 'xrw')
+    )
+    # Sections which are not loaded are reported as discarded
+    mm.get_node('.comment', create=True).address = '0x0'
+    per_section = count // len(SECTIONS)
+    objfiles = max(per_section // (SYMBOLS_PER_OBJFILE + 1), 1)
+    for sidx, section in enumerate(SECTIONS):
+        top = mm.get_node(section, create=True)
+        address = 0x08000000 if sidx < 2 else 0x20000000
+        top.address = hex(address)
+        for oidx in range(objfiles):
+            objfile = 'module_{0:05d}.o'.format(oidx)
+            onode = top.add_child(name=objfile.replace('.', '_'))
+            for idx in range(SYMBOLS_PER_OBJFILE):
+                leaf = onode.add_child(
+                    name='{0}_function_{1:03d}'.format(objfile[:-2], idx)
+                )
+                leaf.address = hex(address)
+                leaf.osize = '0x10'
+                leaf.objfile = _copy(objfile)
+                leaf.arfile = _copy('libmodules.a')
+                leaf.arfolder = _copy('/opt/toolchain/lib/gcc/thumb/')
+                address += 0x10
+    return mm
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    tracemalloc.start()
+    start = time.time()
+    mm = build_map(count)
+    nodes = mm.root.all_nodes()
+    built = tracemalloc.get_traced_memory()[0]
+    for node in nodes:
+        node.region
+        node.gident
+    resolved = tracemalloc.get_traced_memory()[0]
+    elapsed = time.time() - start
+    print("{0} nodes in {1:.1f}s".format(len(nodes), elapsed))
+    print("{0:>30} {1:>8.1f}".format('bytes per node, as built',
+                                     built / len(nodes)))
+    print("{0:>30} {1:>8.1f}".format('with regions and gidents',
+                                     resolved / len(nodes)))
+    tracemalloc.stop()
+    start = time.time()
+    size = mm.get_arfile_fp_rgn('libmodules.a', 'FLASH')
+    print("{0:>30} {1:>8.2f}s".format('arfile footprint in FLASH',
+                                      time.time() - start))
+    assert size == mm.get_node('.text').size + mm.get_node('.rodata').size
+
+
+if __name__ == '__main__':
+    main()
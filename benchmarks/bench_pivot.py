@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time taken by the object file footprint reports of ``--sobj all`` and
+``--ssec`` on a synthetic memory map, with a scan of the nodes for each
+cell and for the list of columns of each row as it used to be, and from
+the footprint pivots and cached column lists of the map.
+
+The map is that of ``bench_node_memory.py``. Only a sample of the rows are
+computed by scanning the nodes, and the time for all of them is
+extrapolated from it. The time for the pivots includes building them.
+
+Run from the repository root :
+
+    python benchmarks/bench_pivot.py [NODES]
+
+NODES defaults to 100000.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from bench_node_memory import build_map
+from fpvgcc.cli import print_objfile_fp
+from fpvgcc.cli import print_sectioned_fp
+
+
+def _scan_region_row(mm, objfile):
+    return [mm.get_objfile_fp_rgn(objfile, x) for x in mm._used_regions()]
+
+
+def _scan_section_row(mm, objfile):
+    return [mm.get_objfile_fp_sec(objfile, x) for x in mm._used_sections()]
+
+
+def _compare(mm, name, scan, report, row, objfiles):
+    sample = objfiles[::max(len(objfiles) // 10, 1)]
+    start = time.time()
+    expected = [scan(mm, x) for x in sample]
+    elapsed = (time.time() - start) * len(objfiles) / len(sample)
+    print("{0:>24} {1:>8.2f}s".format(name + ', nodes', elapsed))
+
+    mm._pivots = None
+    mm._derived = {}
+    start = time.time()
+    with open(os.devnull, 'w') as f:
+        report(mm, file=f)
+    print("{0:>24} {1:>8.2f}s".format(name + ', pivots', time.time() - start))
+    assert [row(x) for x in sample] == expected
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    mm = build_map(count)
+    objfiles = mm.used_objfiles
+    print("{0} nodes, {1} object files".format(
+        len(mm.root.all_nodes()), len(objfiles)))
+    _compare(mm, '--sobj all', _scan_region_row, print_objfile_fp,
+             mm.get_objfile_fp, objfiles)
+    _compare(mm, '--ssec', _scan_section_row, print_sectioned_fp,
+             mm.get_objfile_fp_secs, objfiles)
+
+
+if __name__ == '__main__':
+    main()
@@ -91,6 +91,7 @@ setup(
         'build': build_requires,
         'publish': publish_requires,
         'dev': build_requires,
+        'columnar': ['numpy'],
     },
     platforms='any',
     entry_points={
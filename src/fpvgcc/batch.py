@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Batch analysis of many map files.
+
+Map files are parsed and summarized in a pool of worker processes, and the
+per-map reports are yielded (or printed) in the order the map files were
+given, each as soon as it and all the ones before it are ready.
+"""
+
+import argparse
+import glob
+import io
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from .cli import _add_row
+from .cli import _add_totals_row
+from .cli import _build_table_header
+from .cli import _render_table
+from .cli import _setup_logging
+from .cli import print_objfile_fp
+from .fpv import process_map_file
+from .profiles import get_profile
+from .profiles import profiles
+from .profiles.guess import guess_profile
+
+
+MapReport = namedtuple('MapReport', 'mapfile regions totals report')
+
+
+def expand_mapfiles(patterns):
+    """
+    Expand glob patterns into a list of map files, preserving the order in
+    which they were given and dropping duplicates.
+    """
+    mapfiles = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern]
+        for mapfile in matches:
+            if mapfile not in mapfiles:
+                mapfiles.append(mapfile)
+    return mapfiles
+
+
+def analyze_map(mapfile, profile='auto'):
+    """
+    Parse a single map file and summarize it.
+
+    :param mapfile: Path to the map file.
+    :param profile: Profile name, or 'auto' to guess it from the map file.
+    :return: :class:`MapReport` with the used regions, the total footprint
+             in each of them, and the rendered per-objfile footprint table.
+    """
+    if profile == 'auto':
+        profile = guess_profile(mapfile)
+    sm = process_map_file(mapfile, profile=get_profile(profile))
+    mm = sm.memory_map
+    report = io.StringIO()
+    totals = print_objfile_fp(mm, file=report)
+    return MapReport(mapfile, mm.used_regions, totals, report.getvalue())
+
+
+def analyze_maps(patterns, jobs=None, profile='auto', verbose=0):
+    """
+    Analyze many map files across a pool of worker processes.
+
+    :param patterns: Map file paths and/or glob patterns.
+    :param jobs: Number of worker processes. Defaults to the CPU count.
+    :param profile: Profile name, or 'auto' to guess it for each map file.
+    :param verbose: Verbosity of the logging in the worker processes, as
+                    for the -v option.
+    :return: Generator of :class:`MapReport`, in the order of the inputs.
+    """
+    mapfiles = expand_mapfiles(patterns)
+    # Workers configure their own logging, since they do not inherit it
+    # from this process unless they are forked.
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_setup_logging,
+                             initargs=(verbose,)) as executor:
+        for result in executor.map(analyze_map, mapfiles,
+                                   [profile] * len(mapfiles)):
+            yield result
+
+
+def print_region_totals(reports, file=None):
+    cols = []
+    for report in reports:
+        for region in report.regions:
+            if region not in cols:
+                cols.append(region)
+    tbl, totals = _build_table_header(cols, 'MAPFILE')
+    for report in reports:
+        row = [0] * len(cols)
+        for region, total in zip(report.regions, report.totals):
+            row[cols.index(region)] = total
+        totals = _add_row(tbl, report.mapfile, row, totals)
+    _add_totals_row(tbl, totals)
+    _render_table(tbl, file=file)
+    return totals
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog='fpvgcc batch',
+        description='Analyze many GCC generated Map files at once.'
+    )
+    parser.add_argument('mapfiles', metavar='MAPFILE', nargs='+',
+                        help='Map files or glob patterns to analyze.')
+    parser.add_argument('-v', '--verbose',
+                        help='Include detailed warnings in the output.',
+                        action='count', default=0)
+    parser.add_argument('-p', '--profile', metavar='PROFILE',
+                        choices=profiles.keys(), default='auto')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=None,
+                        help='Number of worker processes to use.')
+    return parser
+
+
+def main(argv=None):
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+    _setup_logging(args.verbose)
+    reports = []
+    for report in analyze_maps(args.mapfiles, jobs=args.jobs,
+                               profile=args.profile, verbose=args.verbose):
+        print(report.mapfile)
+        print(report.report)
+        reports.append(report)
+    print_region_totals(reports)
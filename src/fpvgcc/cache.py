@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Persistent on-disk cache of parsed map files.
+
+Entries are keyed by the content hash of the map file and the profile used
+to parse it. To avoid rehashing unchanged files, the cache directory also
+holds an index of the size, mtime and hash last seen for each map file
+path. A cache entry holds a compact, flattened form of the memory map tree
+along with the other results of the parse, and is restored without running
+the parser. Entries are stored as compressed JSON, so that reading one
+from a cache directory others can write to cannot run code.
+
+Any problem reading an entry is treated as a cache miss, and any problem
+writing to the cache directory only skips caching the parse.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+from .dependencies import ArchiveDependencyGraph
+from .discarded import DiscardedSections
+from .fpv import CommonSymbol
+from .fpv import GCCMemoryMapParserSM
+from .fpv import IDLArchive
+from .fpv import IDLSymbol
+from .fpv import LinkerDefnAddr
+from .gccMemoryMap import GCCMemoryMapNode
+from .gccMemoryMap import MemoryRegion
+
+
+CACHE_FORMAT_VERSION = 5
+CACHE_SUFFIX = '.fpvc'
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+_node_fields = ('_address', '_defsize', '_size', '_fillsize',
+                'arfolder', 'arfile', 'objfile')
+
+
+# Conversion of the other results of the parse to and from plain lists and
+# dicts, as (field, dump, load).
+
+def _dump_idep_archives(sm):
+    symbols = dict((id(x), idx) for idx, x in enumerate(sm.idep_symbols))
+    return [(a.folder, a.archive, a.objfile,
+             symbols.get(id(a.becauseof)))
+            for a in sm.idep_archives]
+
+
+def _load_idep_archives(sm, value):
+    sm.idep_archives = []
+    for folder, archive, objfile, becauseof in value:
+        a = IDLArchive(folder, archive, objfile)
+        if becauseof is not None:
+            a.becauseof = sm.idep_symbols[becauseof]
+        sm.idep_archives.append(a)
+
+
+def _load_dependencies(sm, value):
+    sm.dependencies = ArchiveDependencyGraph()
+    sm.dependencies.load(value)
+
+
+def _load_discarded(sm, value):
+    sm.discarded = DiscardedSections()
+    for row in value:
+        sm.discarded.append(*row)
+
+
+def _set(field, func):
+    def load(sm, value):
+        setattr(sm, field, [func(*x) for x in value])
+    return load
+
+
+_sm_fields = (
+    ('state', lambda sm: sm.state,
+     lambda sm, v: setattr(sm, 'state', v)),
+    ('loaded_files', lambda sm: sm.loaded_files,
+     lambda sm, v: setattr(sm, 'loaded_files', v)),
+    ('linker_defined_addresses',
+     lambda sm: [(x.symbol, x.address, x.defn_addr)
+                 for x in sm.linker_defined_addresses],
+     _set('linker_defined_addresses',
+          lambda s, a, d: LinkerDefnAddr(s, hex(a), hex(d)))),
+    ('common_symbols',
+     lambda sm: [(x.symbol, x.size, x.filefolder, x.archivefile, x.objfile)
+                 for x in sm.common_symbols],
+     _set('common_symbols',
+          lambda s, z, f, a, o: CommonSymbol(s, hex(z), f, a, o))),
+    ('idep_symbols',
+     lambda sm: [(x.folder, x.objfile, x.symbol) for x in sm.idep_symbols],
+     _set('idep_symbols', IDLSymbol)),
+    # After idep_symbols, which the archives refer to
+    ('idep_archives', _dump_idep_archives, _load_idep_archives),
+    ('dependencies', lambda sm: sm.dependencies.dump(), _load_dependencies),
+    ('discarded', lambda sm: list(sm.discarded), _load_discarded),
+)
+
+
+def _profile_key(profile):
+    return '{0}.{1}'.format(type(profile).__module__,
+                            type(profile).__name__)
+
+
+def _file_hash(fname):
+    h = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def dump_state(sm):
+    """
+    Flatten the results of a parse into plain python containers, which
+    can be stored as JSON.
+
+    The tree is stored as a preorder list of node tuples, each holding the
+    index of its parent followed by the node name and its leaf properties.
+    """
+    nodes = []
+    index = {}
+    stack = [sm.memory_map.root]
+    while stack:
+        node = stack.pop()
+        index[id(node)] = len(nodes)
+        parent = index.get(id(node.parent), -1)
+        nodes.append((parent, node.name) +
+                     tuple(getattr(node, f) for f in _node_fields))
+        stack.extend(reversed(node.children))
+    state = {
+        'version': CACHE_FORMAT_VERSION,
+        'nodes': nodes,
+        'memory_regions': [(r.name, r.origin, r.size, r.attribs)
+                           for r in sm.memory_map.memory_regions],
+        'aliases': sm.memory_map.aliases.items(),
+    }
+    for field, dump, _ in _sm_fields:
+        state[field] = dump(sm)
+    return state
+
+
+def load_state(state, profile):
+    """
+    Rebuild a :class:`fpvgcc.fpv.GCCMemoryMapParserSM` from :func:`dump_state`
+    output.
+    """
+    if state['version'] != CACHE_FORMAT_VERSION:
+        raise ValueError("Unsupported cache format version")
+    sm = GCCMemoryMapParserSM(ctx=profile)
+    mm = sm.memory_map
+    mm.memory_regions = [MemoryRegion(n, hex(o), hex(s), a)
+                         for n, o, s, a in state['memory_regions']]
+    mm.aliases.load(state['aliases'])
+    for field, _, load in _sm_fields:
+        load(sm, state[field])
+
+    # The structure is put together first, so that adding children does
+    # not run into leaf properties which have already been set.
+    nodes = [mm.root]
+    for entry in state['nodes'][1:]:
+        node = GCCMemoryMapNode(name=entry[1])
+        nodes[entry[0]].add_child(node)
+        nodes.append(node)
+    for node, entry in zip(nodes, state['nodes']):
+        for field, value in zip(_node_fields, entry[2:]):
+            setattr(node, field, value)
+    mm.resolve_regions()
+    return sm
+
+
+class MapCache(object):
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError as e:
+                logging.warning("Unable to create cache directory {0} : {1}"
+                                "".format(cache_dir, e))
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _read_index(self):
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def content_hash(self, fname):
+        # Reuse the hash recorded for this path if the file looks unchanged
+        st = os.stat(fname)
+        path = os.path.abspath(fname)
+        index = self._read_index()
+        known = index.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        digest = _file_hash(fname)
+        index[path] = [st.st_size, st.st_mtime_ns, digest]
+        self._write_index(index)
+        return digest
+
+    def _write_index(self, index):
+        try:
+            _write_atomic(self._index_path,
+                          json.dumps(index).encode('utf-8'))
+        except (IOError, OSError) as e:
+            logging.warning("Unable to update cache index {0} : {1}"
+                            "".format(self._index_path, e))
+
+    def entry_path(self, fname, profile):
+        key = '{0}-{1}-{2}'.format(self.content_hash(fname),
+                                   _profile_key(profile),
+                                   CACHE_FORMAT_VERSION)
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, fname, profile):
+        path = self.entry_path(fname, profile)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                state = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            sm = load_state(state, profile)
+        except Exception as e:
+            logging.warning("Discarding unusable cache entry {0} : {1}"
+                            "".format(path, e))
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        logging.info("Loaded {0} from cache : {1}".format(fname, path))
+        return sm
+
+    def put(self, fname, profile, sm):
+        path = self.entry_path(fname, profile)
+        data = json.dumps(dump_state(sm)).encode('utf-8')
+        try:
+            _write_atomic(path, zlib.compress(data, 1))
+            self.evict()
+        except (IOError, OSError) as e:
+            logging.warning("Unable to write cache entry {0} : {1}"
+                            "".format(path, e))
+
+    def evict(self):
+        # Drop the least recently used entries until the total size of the
+        # cache is within max_size, and then the index records of map files
+        # which no longer have any entries.
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(e[1] for e in entries)
+        kept = []
+        for mtime, size, path in sorted(entries):
+            if total > self.max_size:
+                os.unlink(path)
+                total -= size
+            else:
+                kept.append(path)
+        digests = set(os.path.basename(x).split('-', 1)[0] for x in kept)
+        index = self._read_index()
+        pruned = dict((k, v) for k, v in index.items() if v[2] in digests)
+        if len(pruned) != len(index):
+            self._write_index(pruned)
@@ -24,6 +24,8 @@ Docstring for cli
 
 import argparse
 import logging
+import os
+import sys
 from prettytable import PrettyTable
 
 from .fpv import process_map_file
@@ -55,12 +57,12 @@ def _add_totals_row(tbl, totals):
     tbl.add_row(['TOTALS'] + totals + [''])
 
 
-def _render_table(tbl):
+def _render_table(tbl, file=None):
     print(tbl.get_string(sortby='TOTAL', reversesort=True,
-                         sort_key=lambda x: x[-1] or 0))
+                         sort_key=lambda x: x[-1] or 0), file=file)
 
 
-def print_symbol_fp(mm, lfile='all'):
+def print_symbol_fp(mm, lfile='all', file=None):
     cols = mm.used_regions
     tbl, totals = _build_table_header(cols, 'SYMBOL')
 
@@ -70,16 +72,17 @@ def print_symbol_fp(mm, lfile='all'):
         symbols = mm.symbols_from_file(lfile)
 
     for symbol in symbols:
-        nextrow = mm.get_symbol_fp(symbol)
+        nextrow = mm.get_symbol_fp(symbol, cols)
         if not sum(nextrow):
             continue
         totals = _add_row(tbl, symbol, nextrow, totals)
 
     _add_totals_row(tbl, totals)
-    _render_table(tbl)
+    _render_table(tbl, file=file)
+    return totals
 
 
-def print_objfile_fp(mm, arfile='all'):
+def print_objfile_fp(mm, arfile='all', file=None):
     cols = mm.used_regions
     tbl, totals = _build_table_header(cols, 'OBJFILE')
 
@@ -89,44 +92,47 @@ def print_objfile_fp(mm, arfile='all'):
         objfiles = mm.arfile_objfiles(arfile)
 
     for objfile in objfiles:
-        nextrow = mm.get_objfile_fp(objfile)
+        nextrow = mm.get_objfile_fp(objfile, cols)
         totals = _add_row(tbl, objfile, nextrow, totals)
 
     _add_totals_row(tbl, totals)
-    _render_table(tbl)
+    _render_table(tbl, file=file)
+    return totals
 
 
-def print_arfile_fp(mm):
+def print_arfile_fp(mm, file=None):
     cols = mm.used_regions
     tbl, totals = _build_table_header(cols, 'ARFILE')
 
     for arfile in mm.used_arfiles:
-        nextrow = mm.get_arfile_fp(arfile)
+        nextrow = mm.get_arfile_fp(arfile, cols)
         totals = _add_row(tbl, arfile, nextrow, totals)
 
     _add_totals_row(tbl, totals)
-    _render_table(tbl)
+    _render_table(tbl, file=file)
+    return totals
 
 
-def print_file_fp(mm):
+def print_file_fp(mm, file=None):
     cols = mm.used_regions
     tbl, totals = _build_table_header(cols, 'FILE')
 
     objfiles, arfiles = mm.used_files
 
     for objfile in objfiles:
-        nextrow = mm.get_objfile_fp(objfile)
+        nextrow = mm.get_objfile_fp(objfile, cols)
         totals = _add_row(tbl, objfile, nextrow, totals)
 
     for arfile in arfiles:
-        nextrow = mm.get_arfile_fp(arfile)
+        nextrow = mm.get_arfile_fp(arfile, cols)
         totals = _add_row(tbl, arfile, nextrow, totals)
 
     _add_totals_row(tbl, totals)
-    _render_table(tbl)
+    _render_table(tbl, file=file)
+    return totals
 
 
-def print_sectioned_fp(mm):
+def print_sectioned_fp(mm, file=None):
     cols = mm.used_sections
     tbl, totals = _build_table_header(cols, 'FILE')
 
@@ -135,15 +141,32 @@ def print_sectioned_fp(mm):
     # objfiles, arfiles = mm.used_files
 
     for objfile in objfiles:
-        nextrow = mm.get_objfile_fp_secs(objfile)
+        nextrow = mm.get_objfile_fp_secs(objfile, cols)
         totals = _add_row(tbl, objfile, nextrow, totals)
 
     for arfile in arfiles:
-        nextrow = mm.get_arfile_fp_secs(arfile)
+        nextrow = mm.get_arfile_fp_secs(arfile, cols)
         totals = _add_row(tbl, arfile, nextrow, totals)
 
     _add_totals_row(tbl, totals)
-    _render_table(tbl)
+    _render_table(tbl, file=file)
+    return totals
+
+
+def print_discarded_fp(sm, file=None):
+    discarded = sm.discarded
+    cols = discarded.kinds
+    tbl, totals = _build_table_header(cols, 'OBJFILE')
+
+    for objfile in discarded.used_objfiles:
+        nextrow = discarded.get_objfile_size_kindvec(objfile, cols)
+        if not sum(nextrow):
+            continue
+        totals = _add_row(tbl, objfile, nextrow, totals)
+
+    _add_totals_row(tbl, totals)
+    _render_table(tbl, file=file)
+    return totals
 
 
 def print_files_list(fl):
@@ -161,8 +184,30 @@ def print_aliases(sm):
     print(sm.memory_map.aliases)
 
 
+def print_archive_dependencies(sm, name):
+    graph = sm.dependencies
+    member = graph.resolve(name)
+    if member is None:
+        print("Not found in the archive dependencies, or ambiguous : "
+              "{0}".format(name))
+        return
+    print(member)
+    chain = graph.why(member)
+    if chain:
+        print("Linked to satisfy :")
+        for _, referrer, symbol in chain:
+            print("  {0} referenced by {1}".format(symbol, referrer))
+    pulled = graph.pulls_in_all(member)
+    print("Pulls in {0} archive members :".format(len(pulled)))
+    for depth, pmember, symbol in pulled:
+        print("{0}{1} ({2})".format('  ' * depth, pmember, symbol))
+
+
 def _get_parser():
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(
+        epilog="Use 'fpvgcc batch --help' for analyzing many map files "
+               "at once."
+    )
     parser.add_argument('mapfile',
                         help='GCC generated Map file to analyze.')
     parser.add_argument('-v', '--verbose',
@@ -170,6 +215,21 @@ def _get_parser():
                         action='count', default=0)
     parser.add_argument('-p', '--profile', metavar='PROFILE',
                         choices=profiles.keys(), default='auto')
+    parser.add_argument('--mmap', action='store_true',
+                        help='Memory map the file instead of reading it.')
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=None,
+                        help='Parse output sections in N parallel '
+                             'processes.')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Parse output sections only as they are '
+                             'needed. Not compatible with --mmap, -j and '
+                             '--cache, and does not use FPVGCC_CACHE.')
+    parser.add_argument('--columnar', action='store_true',
+                        help='Answer footprint queries from a columnar '
+                             'table of the map.')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='Cache parsed map files in DIR. Defaults to '
+                             'the FPVGCC_CACHE environment variable.')
     action = parser.add_mutually_exclusive_group(required=True)
     action.add_argument('--sar', action='store_true',
                         help='Print summary of usage per included file.')
@@ -205,26 +265,57 @@ def _get_parser():
                         help='Print list of detected aliases.')
     action.add_argument('--addr', metavar='ADDRESS',
                         help='Describe contents at specified address.')
+    action.add_argument('--sgc', action='store_true',
+                        help='Print summary of discarded input sections '
+                             'per object file.')
+    action.add_argument('--why', metavar='FILE',
+                        help='Show why an archive member or object file was '
+                             'linked, and what else it pulled in.')
     return parser
 
 
-def main():
-    parser = _get_parser()
-    args = parser.parse_args()
-    if args.verbose == 0:
+def _setup_logging(verbose):
+    if verbose == 0:
         logging.basicConfig(level=logging.ERROR)
-    elif args.verbose == 1:
+    elif verbose == 1:
         logging.basicConfig(level=logging.WARNING)
-    elif args.verbose == 2:
+    elif verbose == 2:
         logging.basicConfig(level=logging.INFO)
-    elif args.verbose == 3:
+    elif verbose == 3:
         logging.basicConfig(level=logging.DEBUG)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['batch']:
+        from .batch import main as batch_main
+        return batch_main(argv[1:])
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+    if args.lazy:
+        for option, value in (('--mmap', args.mmap), ('-j', args.jobs),
+                              ('--cache', args.cache)):
+            if value:
+                parser.error("argument --lazy: not allowed with argument "
+                             "{0}".format(option))
+    elif args.cache is None:
+        args.cache = os.environ.get('FPVGCC_CACHE')
+    _setup_logging(args.verbose)
     if args.profile == 'auto':
         pname = guess_profile(args.mapfile)
     else:
         pname = args.profile
     profile = get_profile(pname)
-    state_machine = process_map_file(args.mapfile, profile=profile)
+    if args.lazy:
+        from .lazy import process_map_file_lazy
+        state_machine = process_map_file_lazy(args.mapfile, profile=profile)
+    else:
+        state_machine = process_map_file(args.mapfile, profile=profile,
+                                         use_mmap=args.mmap, jobs=args.jobs,
+                                         cache_dir=args.cache)
+    if args.columnar:
+        state_machine.memory_map.columnar = True
     if args.sar:
         print_file_fp(state_machine.memory_map)
     elif args.sobj:
@@ -248,6 +339,10 @@ def main():
         print_files_list(state_machine.loaded_files)
     elif args.la:
         print_aliases(state_machine)
+    elif args.sgc:
+        print_discarded_fp(state_machine)
+    elif args.why:
+        print_archive_dependencies(state_machine, args.why)
     elif args.lmap:
         if args.lmap == 'root':
             for node in state_machine.memory_map.top_level_nodes:
@@ -265,6 +360,6 @@ def main():
             if node.objfile == args.lobj:
                 print(node)
     elif args.addr:
-        for node in state_machine.memory_map.root.all_nodes():
-            if node.contains_address(args.addr):
-                print(node)
+        index = state_machine.memory_map.address_index
+        for node in index.lookup_all(int(args.addr, 0)):
+            print(node)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Columnar view of a parsed memory map.
+
+:class:`MapColumns` holds one row per node of a
+:class:`fpvgcc.gccMemoryMap.GCCMemoryMap`, in the preorder of
+``root.all_nodes()``, with a column per node property. Names are stored as
+ids into a string table of the columns, file names as ids into the string
+table of the memory map, and regions as codes into its region table.
+Since the rows are in preorder, the nodes of any subtree are a contiguous
+range of rows.
+
+Footprint queries then become sums of the leaf sizes of the rows grouped
+by some of the columns, which are done with NumPy if it is installed, and
+as a single pass over the columns otherwise. The columns are built from
+the nodes of the map, which remain the primary representation. They are
+held in addition to the nodes, and not in place of them.
+"""
+
+from array import array
+
+from .datastructures.strings import StringTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Stored in the address and size columns for nodes which have none
+NO_VALUE = 2 ** 64 - 1
+
+# Stored in the region column for nodes whose region could not be resolved
+NO_REGION = -1
+
+
+def _group_sum_numpy(keys, values):
+    keys = [numpy.frombuffer(k, dtype=numpy.int64) for k in keys]
+    values = numpy.frombuffer(values, dtype=numpy.uint64)
+    composite = keys[0]
+    for k in keys[1:]:
+        composite = composite * (int(k.max()) + 1) + k
+    order = numpy.argsort(composite, kind='stable')
+    ordered = composite[order]
+    starts = numpy.flatnonzero(
+        numpy.concatenate(([True], ordered[1:] != ordered[:-1]))
+    )
+    sums = numpy.add.reduceat(values[order], starts)
+    firsts = order[starts]
+    return dict((tuple(int(k[i]) for k in keys), int(s))
+                for i, s in zip(firsts, sums))
+
+
+def _group_sum_python(keys, values):
+    rval = {}
+    for row in zip(values, *keys):
+        key = row[1:]
+        rval[key] = rval.get(key, 0) + row[0]
+    return rval
+
+
+class MapColumns(object):
+    # Number of group sums kept by the columns
+    group_sum_cache_size = 64
+
+    def __init__(self, mm):
+        self.memory_map = mm
+        self.strings = mm.strings
+        # Names of the nodes, which are kept apart from the file names in
+        # the string table of the memory map
+        self.names = StringTable()
+        self.nodes = mm.root.all_nodes()
+        # Taken after the traversal, which loads lazily parsed maps
+        self.generation = mm.generation
+        self.parent = array('q')
+        # Row after the last row of the subtree of each node
+        self.end = array('q')
+        self.name = array('q')
+        self.address = array('Q')
+        self.size = array('Q')
+        self.fill = array('Q')
+        self.leafsize = array('Q')
+        self.objfile = array('q')
+        self.arfile = array('q')
+        self.region = array('q')
+        # Whether the regions of all the nodes could be resolved
+        self.complete = True
+        self._group_sums = {}
+        self._build()
+
+    def string_id(self, column, value):
+        """
+        :return: The id of a string in a column, or None if no node has it.
+        """
+        if column == 'name':
+            return self.names.id(value)
+        return self.strings.id(value)
+
+    def _build(self):
+        rows = {}
+        stack = []
+        for idx, node in enumerate(self.nodes):
+            rows[id(node)] = idx
+            self.parent.append(rows.get(id(node.parent), -1))
+            self.end.append(0)
+            # Close the subtrees this node is not a part of, which end
+            # just before it
+            while stack and self.parent[idx] != stack[-1]:
+                self.end[stack.pop()] = idx
+            stack.append(idx)
+            self.name.append(self.names.intern(node.name))
+            self.address.append(
+                NO_VALUE if node._address is None else node._address
+            )
+            self.size.append(NO_VALUE if node._size is None else node._size)
+            self.fill.append(node.fillsize or 0)
+            self.leafsize.append(node.leafsize or 0)
+            self.objfile.append(node._objfile)
+            self.arfile.append(node._arfile)
+            try:
+                region = self.memory_map.region_code(node.region)
+            except ValueError:
+                region = NO_REGION
+                self.complete = False
+            self.region.append(region)
+        for idx in stack:
+            self.end[idx] = len(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def row_range(self, node):
+        """
+        :return: (start, end) of the rows of the subtree of a node.
+        """
+        path = []
+        walker = node
+        while walker is not self.memory_map.root:
+            path.append(walker)
+            walker = walker.parent
+        row = 0
+        for target in reversed(path):
+            row += 1
+            while self.nodes[row] is not target:
+                row = self.end[row]
+        return row, self.end[row]
+
+    def group_sum(self, columns, start=0, end=None):
+        """
+        Sum the leaf sizes of rows grouped by the values of some of the
+        key columns.
+
+        :param columns: Tuple of names of key columns.
+        :param start: First row to include.
+        :param end: Row after the last to include. Defaults to all rows.
+        :return: dict of (value, ...) -> sum of leaf sizes, with the values
+                 in the order of the columns.
+        """
+        if end is None:
+            end = len(self)
+        key = (columns, start, end)
+        if key not in self._group_sums:
+            keys = [getattr(self, c)[start:end] for c in columns]
+            values = self.leafsize[start:end]
+            if not len(values):
+                sums = {}
+            elif numpy is not None:
+                sums = _group_sum_numpy(keys, values)
+            else:
+                sums = _group_sum_python(keys, values)
+            if len(self._group_sums) >= self.group_sum_cache_size:
+                del self._group_sums[next(iter(self._group_sums))]
+            self._group_sums[key] = sums
+            return sums
+        return self._group_sums[key]
+
+    def region_codes(self, region):
+        """
+        :return: Codes of the regions with a name, or of all the vector
+                 regions if it is None.
+        """
+        names = self.memory_map.region_names
+        if region is None:
+            return [c for c, n in enumerate(names) if 'VEC' in n]
+        return [c for c, n in enumerate(names) if n == region]
+
+    def fp_rgn(self, column, value, region):
+        """
+        :return: Total leaf size of the nodes whose column has the value
+                 and which are in the region, or in any vector region if
+                 it is None.
+        """
+        sid = self.string_id(column, value)
+        if sid is None:
+            return 0
+        sums = self.group_sum((column, 'region'))
+        return sum(sums.get((sid, code), 0)
+                   for code in self.region_codes(region))
+
+    def fp_subtree(self, column, value, node):
+        """
+        :return: Total leaf size of the nodes in the subtree of a node
+                 whose column has the value.
+        """
+        sid = self.string_id(column, value)
+        if sid is None:
+            return 0
+        start, end = self.row_range(node)
+        return self.group_sum((column,), start, end).get((sid,), 0)
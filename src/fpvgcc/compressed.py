@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Transparent reading of compressed map files.
+
+gzip, bzip2 and xz compressed map files are recognized by their magic
+bytes, whatever they are named, and are decompressed as a stream while
+they are read. Compressed files cannot be memory mapped or seeked through
+cheaply, so the parsers which need byte offsets into the file fall back to
+a sequential parse for them.
+"""
+
+import bz2
+import gzip
+import lzma
+
+
+_compression_types = (
+    (b'\x1f\x8b', 'gzip', gzip.open),
+    (b'BZh', 'bz2', bz2.open),
+    (b'\xfd7zXZ\x00', 'xz', lzma.open),
+)
+
+
+def _magic_lookup(fname):
+    with open(fname, 'rb') as f:
+        head = f.read(6)
+    for magic, name, opener in _compression_types:
+        if head.startswith(magic):
+            return name, opener
+    return None, open
+
+
+def compression_type(fname):
+    """
+    :return: 'gzip', 'bz2' or 'xz' for compressed files, otherwise None.
+    """
+    return _magic_lookup(fname)[0]
+
+
+def open_map_file(fname, binary=False):
+    """
+    Open a map file for reading, decompressing it on the fly if needed.
+
+    :param fname: Path to the map file.
+    :param binary: Read bytes instead of text.
+    :return: File object.
+    """
+    opener = _magic_lookup(fname)[1]
+    return opener(fname, 'rb' if binary else 'rt')
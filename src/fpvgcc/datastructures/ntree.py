@@ -19,30 +19,122 @@
 
 
 import logging
-from functools import cached_property, lru_cache
+import sys
 from os.path import commonprefix
 
 
+def _split_disambig(ident):
+    base, sep, d = ident.rpartition(':')
+    if sep and d.isdigit():
+        return base, int(d)
+    return ident, None
+
+
+class ChildIndex(object):
+    """
+    Index of the children of a node by ident, along with the
+    disambiguators in use for each base ident.
+    """
+    __slots__ = ('by_ident', 'duplicates', 'suffixes', 'highest')
+
+    def __init__(self):
+        # ident -> child. If several children share an ident, the first of
+        # them.
+        self.by_ident = {}
+        # ident -> number of children beyond the first which have it
+        self.duplicates = {}
+        # base ident -> {disambiguator: number of children}, for children
+        # named base:disambiguator
+        self.suffixes = {}
+        # base ident -> highest disambiguator in use
+        self.highest = {}
+
+    def add(self, ident, child):
+        if ident in self.by_ident:
+            self.duplicates[ident] = self.duplicates.get(ident, 0) + 1
+        else:
+            self.by_ident[ident] = child
+        base, d = _split_disambig(ident)
+        if d is None:
+            return
+        suffixes = self.suffixes.setdefault(base, {})
+        suffixes[d] = suffixes.get(d, 0) + 1
+        if d > self.highest.get(base, -1):
+            self.highest[base] = d
+
+    def remove(self, ident, child, children):
+        if self.duplicates.get(ident):
+            self.duplicates[ident] -= 1
+            if not self.duplicates[ident]:
+                del self.duplicates[ident]
+            if self.by_ident[ident] is child:
+                for other in children:
+                    if other is not child and other.ident == ident:
+                        self.by_ident[ident] = other
+                        break
+        elif self.by_ident.get(ident) is child:
+            del self.by_ident[ident]
+        else:
+            return
+        base, d = _split_disambig(ident)
+        if d is None:
+            return
+        suffixes = self.suffixes[base]
+        suffixes[d] -= 1
+        if suffixes[d]:
+            return
+        del suffixes[d]
+        if not suffixes:
+            del self.suffixes[base]
+            del self.highest[base]
+        elif d == self.highest[base]:
+            self.highest[base] = max(suffixes)
+
+    def disambig(self, ident, prospective=False):
+        if ident in self.highest:
+            return self.highest[ident]
+        if prospective and ident in self.by_ident:
+            return 0
+        return None
+
+
 class NTreeNode(object):
+    # Nodes are slotted, as trees for large maps have very many of them.
+    # The node type and anything else common to the whole tree is held by
+    # the tree. The node_t argument is accepted for compatibility, but the
+    # type of nodes created by add_child is always that of the tree.
+    __slots__ = ('parent', 'children', '_index', '_gident', '_tree')
     _leaf_property = None
     _ident_property = None
 
     def __init__(self, parent=None, node_t=None):
         self.parent = parent
-        if node_t is None:
-            if self.parent is not None:
-                node_t = self.parent.node_t
-            else:
-                node_t = NTreeNode
-        self.node_t = node_t
+        # The tree the node is a part of, or None if it is not yet attached
+        # to one. Kept up to date by add_child.
+        if isinstance(parent, NTreeNode):
+            self._tree = parent._tree
+        elif isinstance(parent, NTree):
+            self._tree = parent
+        else:
+            self._tree = None
+        self._gident = None
+        self._reset_children()
+
+    def _reset_children(self):
         self.children = []
+        # ChildIndex, created along with the first child
+        self._index = None
 
-    @cached_property
+    @property
     def tree(self):
-        if isinstance(self.parent, NTree):
-            return self.parent
-        else:
-            return self.parent.tree
+        return self._tree
+
+    @property
+    def node_t(self):
+        tree = self._tree
+        if tree is None:
+            return type(self)
+        return tree.node_t
 
     @property
     def is_root(self):
@@ -68,14 +160,11 @@ class NTreeNode(object):
 
     def add_child(self, newchild=None):
         if newchild is None:
-            newchild = self.node_t(parent=self, node_t=self.node_t)
-        try:
-            for child in self.children:
-                if child.ident == newchild.ident:
-                    raise ValueError("Child with that identifier already "
-                                     "exists: {0}".format(newchild.ident))
-        except NotImplementedError:
-            pass
+            newchild = self.node_t(parent=self)
+        if newchild.has_ident and self._index is not None and \
+                newchild.ident in self._index.by_ident:
+            raise ValueError("Child with that identifier already "
+                             "exists: {0}".format(newchild.ident))
         if len(self.children) == 0:
             try:
                 if self._is_leaf_property_set is True:
@@ -86,9 +175,41 @@ class NTreeNode(object):
             except NotImplementedError:
                 pass
         newchild.parent = self
+        if newchild._tree is not self._tree:
+            stack = [newchild]
+            while stack:
+                node = stack.pop()
+                node._tree = self._tree
+                stack.extend(node.children)
+        newchild._invalidate_gident()
         self.children.append(newchild)
+        self._index_child(newchild)
+        self._touch_tree()
         return newchild
 
+    def remove_child(self, child):
+        self.children.remove(child)
+        self._unindex_child(child)
+        self._touch_tree()
+
+    def _touch_tree(self, structure=True):
+        # Nodes which are not yet part of a tree have nothing to invalidate
+        tree = self._tree
+        if tree is not None:
+            tree.touch(structure)
+
+    def _index_child(self, child):
+        if not child.has_ident:
+            return
+        if self._index is None:
+            self._index = ChildIndex()
+        self._index.add(child.ident, child)
+
+    def _unindex_child(self, child):
+        if not child.has_ident or self._index is None:
+            return
+        self._index.remove(child.ident, child, self.children)
+
     @property
     def _is_leaf_property_set(self):
         if self._leaf_property is None:
@@ -122,7 +243,16 @@ class NTreeNode(object):
     @ident.setter
     def ident(self, value):
         if self._ident_property:
+            # Keep the parent's disambiguation counters up to date
+            parent = self.parent
+            if isinstance(parent, NTreeNode):
+                parent._unindex_child(self)
+            if isinstance(value, str):
+                value = sys.intern(value)
             setattr(self, self._ident_property, value)
+            if isinstance(parent, NTreeNode):
+                parent._index_child(self)
+            self._invalidate_gident()
 
     @property
     def has_ident(self):
@@ -130,32 +260,47 @@ class NTreeNode(object):
 
     @property
     def gident(self):
-        rval = self.ident
-        walker = self
-        while not isinstance(walker.parent, NTree):
-            walker = walker.parent
-            rval = walker.ident + '.' + rval
+        # Cached for nodes with an ident property, until the node or one of
+        # its ancestors is renamed or moved. Indices are not stable, and
+        # so the gidents of other nodes are rebuilt each time.
+        rval = self._gident
+        if rval is not None:
+            return rval
+        if isinstance(self.parent, NTree):
+            rval = self.ident
+        else:
+            rval = self.parent.gident + '.' + self.ident
+        if self.has_ident:
+            rval = self._gident = sys.intern(rval)
         return rval
 
+    def _invalidate_gident(self):
+        # The gident of a node is only cached if that of its parent is, so
+        # subtrees without a cached gident need not be walked.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._gident is not None:
+                node._gident = None
+                stack.extend(node.children)
+
     def get_child_by_ident(self, ident):
+        if self.has_ident:
+            try:
+                return self._index.by_ident[ident]
+            except (AttributeError, KeyError):
+                raise ValueError
         for child in self.children:
             if child.ident == ident:
                 return child
         raise ValueError
 
     def get_child_disambig(self, ident, prospective=False):
-        disambig = None
-        for child in self.children:
-            if ':' in child.ident:
-                name, d = child.ident.split(':')
-                if name == ident:
-                    disambig = disambig or 0
-                    disambig = max(disambig, int(d))
-            elif prospective and child.ident == ident:
-                # print("Recommending disambig for {0};{1}
-                # ".format(self.gident, ident))
-                disambig = disambig or 0
-        return disambig
+        # Highest disambiguator of the children named ident:N, if any. If
+        # prospective, a child named ident alone recommends disambiguation.
+        if self._index is None:
+            return None
+        return self._index.disambig(ident, prospective)
 
     def get_descendent_by_ident(self, ident):
         res = self.get_child_by_ident(ident)
@@ -168,15 +313,26 @@ class NTreeNode(object):
                     return res
         return ValueError
 
-    @lru_cache(maxsize=None)
     def all_nodes(self):
-        def iter_all():
-            yield self
-            for child in self.children:
-                for node in child.all_nodes():
-                    yield node
-
-        return list(iter_all())
+        """
+        :return: List of the node and all its descendents, in preorder.
+                 The list is shared with later callers until the tree is
+                 changed, and must not be modified.
+        """
+        tree = self._tree
+        if tree is not None:
+            rval = tree.get_traversal(self)
+            if rval is not None:
+                return rval
+        rval = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            rval.append(node)
+            stack.extend(reversed(node.children))
+        if tree is not None:
+            tree.put_traversal(self, rval)
+        return rval
 
     @property
     def get_top_level_ancestor(self):
@@ -190,10 +346,45 @@ class NTreeNode(object):
 
 class NTree(object):
     node_t = NTreeNode
+    # Number of node traversals kept by the tree
+    traversal_cache_size = 64
 
     def __init__(self):
+        # Incremented whenever nodes are added to or removed from the tree,
+        # and by subclasses when derived properties of nodes change. Results
+        # derived from the tree are only valid for the generation they were
+        # computed in.
+        self.generation = 0
+        self._traversals = {}
         self.root = self.node_t(parent=self, node_t=self.node_t)
 
+    def touch(self, structure=True):
+        """
+        Record a change to the tree. This is done by the nodes themselves
+        when children are added or removed, and must be done by anything
+        which modifies a list of children directly.
+
+        :param structure: False if the change does not affect which nodes
+                          are in the tree, in which case node traversals
+                          are kept.
+        """
+        self.generation += 1
+        if structure and self._traversals:
+            self._traversals = {}
+
+    def get_traversal(self, node):
+        try:
+            return self._traversals[id(node)][1]
+        except KeyError:
+            return None
+
+    def put_traversal(self, node, nodes):
+        if len(self._traversals) >= self.traversal_cache_size:
+            del self._traversals[next(iter(self._traversals))]
+        # The node is held along with the result so that its id is not
+        # reused while the entry exists.
+        self._traversals[id(node)] = (node, nodes)
+
     @property
     def top_level_nodes(self):
         return self.root.children
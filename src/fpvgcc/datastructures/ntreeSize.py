@@ -23,12 +23,21 @@ from .ntree import NTreeNode, NTree
 
 
 class SizeNTreeNode(NTreeNode):
+    __slots__ = ('_subtree_size',)
+
     def __init__(self, parent=None, node_t=None):
+        self._subtree_size = None
         super(SizeNTreeNode, self).__init__(parent, node_t)
-        self._leafsize = None
 
     @property
     def size(self):
+        # The size of each subtree is kept until a change to the children
+        # or to the leaf properties of a node within it invalidates it.
+        # Errors are not kept, so that the missing sizes are reported on
+        # each access, and neither are missing leaf sizes.
+        rval = self._subtree_size
+        if rval is not None:
+            return rval
         rval = 0
         if self.is_leaf:
             rval = self.leafsize
@@ -40,8 +49,36 @@ class SizeNTreeNode(NTreeNode):
                     logging.warning("Size information not available for : "
                                     + child.gident)
                     return "Err"
+        self._subtree_size = rval
         return rval
 
+    def invalidate_size(self):
+        """
+        Discard the sizes of the node and its ancestors. This must be called
+        whenever a leaf property which contributes to the size is changed.
+        """
+        self._touch_tree(structure=False)
+        # A node's size is only kept if those of all its descendents are,
+        # so the walk stops at the first ancestor which is already dirty.
+        walker = self
+        while isinstance(walker, SizeNTreeNode) and \
+                walker._subtree_size is not None:
+            walker._subtree_size = None
+            walker = walker.parent
+
+    def add_child(self, newchild=None):
+        newchild = super(SizeNTreeNode, self).add_child(newchild)
+        self.invalidate_size()
+        return newchild
+
+    def remove_child(self, child):
+        super(SizeNTreeNode, self).remove_child(child)
+        self.invalidate_size()
+
+    def _reset_children(self):
+        super(SizeNTreeNode, self)._reset_children()
+        self.invalidate_size()
+
     @property
     def leafsize(self):
         raise NotImplementedError
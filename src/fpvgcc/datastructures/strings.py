@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Dictionary encoding of strings.
+
+A :class:`StringTable` assigns a small integer id to each distinct string
+it is given, so that each is stored once however many times it occurs,
+and so that comparisons can be made between ids instead of strings. None
+is always id 0.
+"""
+
+
+class StringTable(object):
+    def __init__(self):
+        self.strings = [None]
+        self._ids = {None: 0}
+
+    def intern(self, value):
+        """
+        :return: The id of a string, assigning one if it is new.
+        """
+        try:
+            return self._ids[value]
+        except KeyError:
+            idx = len(self.strings)
+            self.strings.append(value)
+            self._ids[value] = idx
+            return idx
+
+    def id(self, value):
+        """
+        :return: The id of a string, or None if it has none.
+        """
+        return self._ids.get(value)
+
+    def __getitem__(self, idx):
+        return self.strings[idx]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, value):
+        return value in self._ids
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Archive dependency graph, from the "Archive member included to satisfy
+reference by file (symbol)" section of the map file.
+
+The linker lists each archive member it pulls into the link once, along
+with the file (an object file or another archive member) and the symbol
+whose reference caused it to be included. These are indexed in both
+directions, so that why a member was linked and what it went on to pull
+in can be answered without scanning the whole list.
+
+Files can be referred to by their full path as it appears in the map file,
+or by their name without the folder (``libc.a(vfprintf.o)``, ``main.o``)
+if that is unambiguous.
+"""
+
+import re
+
+
+re_archive_member = re.compile(
+    r'^(?P<folder>.*/)?(?P<archive>[^/]+?)\((?P<objfile>[^)]*)\)$'
+)
+
+
+def short_name(name):
+    """
+    Strip the folder from a file or archive member name.
+    """
+    match = re_archive_member.match(name)
+    if match:
+        return '{0}({1})'.format(match.group('archive'),
+                                 match.group('objfile'))
+    return name.rsplit('/', 1)[-1]
+
+
+class ArchiveDependencyGraph(object):
+    def __init__(self):
+        # member -> (referencing file, symbol)
+        self.included_by = {}
+        # referencing file -> [(member, symbol), ...]
+        self.pulled_in = {}
+        # short name -> [full names]
+        self._short_names = {}
+
+    def _index_name(self, name):
+        names = self._short_names.setdefault(short_name(name), [])
+        if name not in names:
+            names.append(name)
+
+    def add(self, member, referrer, symbol):
+        self.included_by[member] = (referrer, symbol)
+        self.pulled_in.setdefault(referrer, []).append((member, symbol))
+        self._index_name(member)
+        self._index_name(referrer)
+
+    def dump(self):
+        """
+        :return: The graph as plain lists, which :meth:`load` takes back.
+        """
+        return [list(self.included_by.items()), list(self.pulled_in.items())]
+
+    def load(self, value):
+        """
+        Replace the contents of the graph with those of a :meth:`dump`.
+        """
+        included_by, pulled_in = value
+        self.included_by = dict((member, tuple(x))
+                                for member, x in included_by)
+        self.pulled_in = dict((referrer, [tuple(x) for x in members])
+                              for referrer, members in pulled_in)
+        self._short_names = {}
+        for member, (referrer, _) in self.included_by.items():
+            self._index_name(member)
+            self._index_name(referrer)
+
+    def __contains__(self, name):
+        return self.resolve(name) is not None
+
+    def __len__(self):
+        return len(self.included_by)
+
+    @property
+    def members(self):
+        return list(self.included_by.keys())
+
+    def resolve(self, name):
+        """
+        :return: The full name of the file as it appears in the map file, or
+                 None if it is unknown or ambiguous.
+        """
+        if name in self.included_by or name in self.pulled_in:
+            return name
+        names = self._short_names.get(name, [])
+        if len(names) == 1:
+            return names[0]
+        return None
+
+    def why(self, name):
+        """
+        Trace the chain of references which caused a file to be linked.
+
+        :return: List of (member, referencing file, symbol), starting from
+                 the file itself and ending at a file which was not
+                 included from an archive.
+        """
+        chain = []
+        member = self.resolve(name)
+        seen = set()
+        while member in self.included_by and member not in seen:
+            seen.add(member)
+            referrer, symbol = self.included_by[member]
+            chain.append((member, referrer, symbol))
+            member = referrer
+        return chain
+
+    def pulls_in(self, name):
+        """
+        :return: The (member, symbol) pairs a file directly caused to be
+                 linked.
+        """
+        return list(self.pulled_in.get(self.resolve(name), []))
+
+    def pulls_in_all(self, name):
+        """
+        :return: List of (depth, member, symbol) for everything a file
+                 caused to be linked, directly or through the members it
+                 pulled in, in depth first order.
+        """
+        rval = []
+        start = self.resolve(name)
+        seen = {start}
+        stack = [(1, m, s) for m, s in reversed(self.pulled_in.get(start, []))]
+        while stack:
+            depth, member, symbol = stack.pop()
+            if member in seen:
+                continue
+            seen.add(member)
+            rval.append((depth, member, symbol))
+            stack.extend((depth + 1, m, s) for m, s
+                         in reversed(self.pulled_in.get(member, [])))
+        return rval
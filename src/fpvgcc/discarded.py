@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Table of the input sections discarded by the linker, from the "Discarded
+input sections" section of the map file.
+
+There are usually a great many of these, mostly from ``--gc-sections``, so
+they are kept in a columnar table rather than as memory map nodes. Every
+string is stored once, in a table shared by all the columns, and the
+columns themselves are arrays of indices into it. Rows are indexed by
+object file, and by the symbol each section was generated for when built
+with ``-ffunction-sections`` / ``-fdata-sections``.
+"""
+
+from array import array
+from collections import namedtuple
+
+from .datastructures.strings import StringTable
+
+
+DiscardedSection = namedtuple(
+    'DiscardedSection', 'name size objfile arfile'
+)
+
+
+def section_kind(name):
+    """
+    The output section type of an input section name, ``.text`` for
+    ``.text.main``.
+    """
+    if name.startswith('.'):
+        return '.' + name[1:].split('.', 1)[0]
+    return name
+
+
+def section_symbol(name):
+    """
+    The symbol an input section was generated for, ``main`` for
+    ``.text.main``, or None.
+    """
+    parts = name.split('.', 2)
+    if len(parts) == 3 and not parts[0]:
+        return parts[2]
+    return None
+
+
+class DiscardedSections(object):
+    def __init__(self):
+        self.strings = StringTable()
+        self.names = array('I')
+        self.sizes = array('Q')
+        self.objfiles = array('I')
+        self.arfiles = array('I')
+        # string id -> [row, ...]
+        self._by_objfile = {}
+        self._by_symbol = {}
+
+    def append(self, name, size, objfile, arfile):
+        row = len(self.names)
+        name_id = self.strings.intern(name)
+        objfile_id = self.strings.intern(objfile)
+        self.names.append(name_id)
+        self.sizes.append(size)
+        self.objfiles.append(objfile_id)
+        self.arfiles.append(self.strings.intern(arfile))
+        self._by_objfile.setdefault(objfile_id, []).append(row)
+        symbol = section_symbol(name)
+        if symbol is not None:
+            self._by_symbol.setdefault(self.strings.intern(symbol),
+                                       []).append(row)
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, idx):
+        s = self.strings
+        return DiscardedSection(s[self.names[idx]], self.sizes[idx],
+                                s[self.objfiles[idx]], s[self.arfiles[idx]])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.row(idx)
+
+    @property
+    def total_size(self):
+        return sum(self.sizes)
+
+    @property
+    def kinds(self):
+        rval = []
+        for name_id in set(self.names):
+            kind = section_kind(self.strings[name_id])
+            if kind not in rval:
+                rval.append(kind)
+        return sorted(rval)
+
+    @property
+    def used_objfiles(self):
+        return [self.strings[x] for x in self._by_objfile.keys()]
+
+    def _rows(self, index, value):
+        return index.get(self.strings.id(value), [])
+
+    def objfile_sections(self, objfile):
+        return [self.row(x) for x in self._rows(self._by_objfile, objfile)]
+
+    def get_objfile_size(self, objfile):
+        rows = self._rows(self._by_objfile, objfile)
+        return sum(self.sizes[x] for x in rows)
+
+    def get_objfile_size_kindvec(self, objfile, kinds):
+        rval = [0] * len(kinds)
+        for x in self._rows(self._by_objfile, objfile):
+            kind = section_kind(self.strings[self.names[x]])
+            rval[kinds.index(kind)] += self.sizes[x]
+        return rval
+
+    def symbol_sections(self, symbol):
+        """
+        :return: The discarded sections generated for a symbol.
+        """
+        return [self.row(x) for x in self._rows(self._by_symbol, symbol)]
+
+    def is_discarded(self, symbol):
+        return len(self._rows(self._by_symbol, symbol)) > 0
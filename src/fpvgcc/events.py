@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Streaming (SAX-style) access to GCC map files.
+
+:func:`iter_map_events` walks a map file with the same regexes and file
+region states as :class:`fpvgcc.fpv.GCCMemoryMapParserSM`, but instead of
+building a :class:`fpvgcc.gccMemoryMap.GCCMemoryMap` it yields one small
+event per interesting line. Only the current section and any pending
+symbol name are retained between lines, so memory use is constant and the
+caller can stop consuming events at any point.
+
+Names are yielded as they appear in the map file. Alias resolution and
+node disambiguation are left to the consumer.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .compressed import open_map_file
+from .fpv import check_line_for_heading
+from .fpv import linkaliases_list
+from .fpv import linkermap_line_key
+from .fpv import linkermap_symbol_files
+from .fpv import re_comsym_detailonly
+from .fpv import re_comsym_nameonly
+from .fpv import re_comsym_normal
+from .fpv import re_linkermap
+from .fpv import re_memregion
+
+
+FileRegionEvent = namedtuple(
+    'FileRegionEvent', 'region'
+)
+MemoryRegionEvent = namedtuple(
+    'MemoryRegionEvent', 'name origin size attribs'
+)
+LoadEvent = namedtuple(
+    'LoadEvent', 'path'
+)
+SectionEvent = namedtuple(
+    'SectionEvent', 'name address size loadaddress'
+)
+SymbolEvent = namedtuple(
+    'SymbolEvent', 'section name address size arfolder arfile objfile'
+)
+FillEvent = namedtuple(
+    'FillEvent', 'section address size'
+)
+AliasEvent = namedtuple(
+    'AliasEvent', 'section aliases'
+)
+CommonSymbolEvent = namedtuple(
+    'CommonSymbolEvent', 'symbol size filefolder archivefile objfile'
+)
+
+
+def _int(value):
+    if value is None:
+        return None
+    return int(value, 16)
+
+
+class MapEventParserSM(object):
+    def __init__(self):
+        self.state = 'START'
+        self.COMSYM_STATE = 'NORMAL'
+        self.comsym_name = None
+        self.LINKERMAP_STATE = 'NORMAL'
+        self.linkermap_section = None
+        self.linkermap_symbol = None
+
+
+def common_symbols_event(line, sm):
+    if sm.COMSYM_STATE == 'NORMAL':
+        match = re_comsym_normal.match(line)
+        if match:
+            return CommonSymbolEvent(
+                match.group('symbol'), _int(match.group('size')),
+                match.group('filefolder') or '', match.group('archivefile'),
+                match.group('objfile')
+            )
+        match = re_comsym_nameonly.match(line)
+        if match:
+            sm.comsym_name = match.group('symbol')
+            sm.COMSYM_STATE = 'GOT_NAME'
+    elif sm.COMSYM_STATE == 'GOT_NAME':
+        match = re_comsym_detailonly.match(line)
+        if match:
+            sm.COMSYM_STATE = 'NORMAL'
+            return CommonSymbolEvent(
+                sm.comsym_name, _int(match.group('size')),
+                match.group('filefolder') or '', match.group('archivefile'),
+                match.group('objfile')
+            )
+    return None
+
+
+def memory_configuration_event(line, sm):
+    match = re_memregion.match(line)
+    if match:
+        return MemoryRegionEvent(
+            match.group('region'), _int(match.group('origin')),
+            _int(match.group('size')), match.group('attribs')
+        )
+    return None
+
+
+def linkermap_section_event(match, sm):
+    name = match.group('name').strip()
+    sm.linkermap_section = name
+    if match.group('address') is None:
+        sm.LINKERMAP_STATE = 'GOT_SECTION_NAME'
+        return None
+    sm.LINKERMAP_STATE = 'IN_SECTION'
+    return SectionEvent(name, _int(match.group('address')),
+                        _int(match.group('size')),
+                        _int(match.group('loadaddress')))
+
+
+def linkermap_section_detail_event(match, sm):
+    sm.LINKERMAP_STATE = 'IN_SECTION'
+    if match is None:
+        return SectionEvent(sm.linkermap_section, None, None, None)
+    return SectionEvent(sm.linkermap_section, _int(match.group('address')),
+                        _int(match.group('size')), None)
+
+
+def linkermap_symbol_event(match, sm, name=None):
+    if name is None:
+        name = match.group('name').strip()
+    sm.linkermap_symbol = None
+    if name == '*fill*':
+        return FillEvent(sm.linkermap_section,
+                         _int(match.group('address')),
+                         _int(match.group('size')))
+    arfolder, arfile, objfile = linkermap_symbol_files(match)
+    return SymbolEvent(sm.linkermap_section, name,
+                       _int(match.group('address')),
+                       _int(match.group('size')),
+                       arfolder, arfile, objfile)
+
+
+def linkermap_symbolonly_event(match, sm):
+    sm.linkermap_symbol = match.group('name').strip()
+    return None
+
+
+def linkermap_fill_event(match, sm):
+    sm.linkermap_symbol = None
+    return FillEvent(sm.linkermap_section, _int(match.group('address')),
+                     _int(match.group('size')))
+
+
+def linkermap_aliases_event(match, sm):
+    return AliasEvent(sm.linkermap_section, linkaliases_list(match))
+
+
+def linkermap_load_event(match, sm):
+    return LoadEvent(
+        ((match.group('filefolder') or '') + match.group('file')).strip()
+    )
+
+
+event_dispatch_normal = {
+    'LOAD': (
+        (re_linkermap['LOAD'], linkermap_load_event),
+    ),
+    'SECTION': (
+        (re_linkermap['SECTION_HEADINGS'], linkermap_section_event),
+    ),
+}
+
+event_dispatch_in_section = {
+    'SECTION': (
+        (re_linkermap['SECTION_HEADINGS'], linkermap_section_event),
+    ),
+    'FILL': (
+        (re_linkermap['FILL'], linkermap_fill_event),
+        (re_linkermap['SYMBOL'], linkermap_symbol_event),
+    ),
+    'ALIASES': (
+        (re_linkermap['LINKALIASES'], linkermap_aliases_event),
+        (re_linkermap['SYMBOL'], linkermap_symbol_event),
+    ),
+    'SYMBOL': (
+        (re_linkermap['SYMBOL'], linkermap_symbol_event),
+        (re_linkermap['SYMBOLONLY'], linkermap_symbolonly_event),
+    ),
+    'SYMBOLONLY': (
+        (re_linkermap['SYMBOLONLY'], linkermap_symbolonly_event),
+        (re_linkermap['SYMBOL'], linkermap_symbol_event),
+    ),
+}
+
+
+def linkermap_event(line, sm):
+    if sm.LINKERMAP_STATE == 'GOT_SECTION_NAME':
+        return linkermap_section_detail_event(
+            re_linkermap['SECTIONDETAIL'].match(line), sm
+        )
+    if sm.LINKERMAP_STATE == 'NORMAL':
+        table = event_dispatch_normal
+    else:
+        if sm.linkermap_symbol is not None:
+            match = re_linkermap['SYMBOLDETAIL'].match(line)
+            if match:
+                return linkermap_symbol_event(match, sm,
+                                              name=sm.linkermap_symbol)
+        table = event_dispatch_in_section
+    for regex, handler in table.get(linkermap_line_key(line), ()):
+        match = regex.match(line)
+        if match:
+            return handler(match, sm)
+    return None
+
+
+@contextmanager
+def _open_map(mapfile):
+    if hasattr(mapfile, 'read'):
+        yield mapfile
+    else:
+        with open_map_file(mapfile) as f:
+            yield f
+
+
+def iter_map_events(mapfile):
+    """
+    Generate parse events from a GCC map file.
+
+    :param mapfile: Path to the map file, or an open text file object.
+    :return: Generator of event namedtuples, in file order.
+    """
+    sm = MapEventParserSM()
+    with _open_map(mapfile) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rval = check_line_for_heading(line)
+            if rval is not None:
+                sm.state = rval
+                yield FileRegionEvent(rval)
+                continue
+            if sm.state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
+                event = linkermap_event(line, sm)
+            elif sm.state == 'IN_COMMON_SYMBOLS':
+                event = common_symbols_event(line, sm)
+            elif sm.state == 'IN_MEMORY_CONFIGURATION':
+                event = memory_configuration_event(line, sm)
+            else:
+                continue
+            if event is not None:
+                yield event
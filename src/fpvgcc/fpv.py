@@ -21,10 +21,16 @@ from __future__ import print_function
 from __future__ import with_statement
 
 import logging
+import mmap
+import os
 import re
+from contextlib import contextmanager
 
 from six import iteritems
 
+from .compressed import compression_type, open_map_file
+from .dependencies import ArchiveDependencyGraph
+from .discarded import DiscardedSections
 from .gccMemoryMap import GCCMemoryMap, MemoryRegion
 from .profiles import get_profile
 from .profiles.guess import guess_profile
@@ -37,10 +43,13 @@ class GCCMemoryMapParserSM(object):
 
         self.IDEP_STATE = 'START'
         self.idep_archive = None
+        self.idep_member = None
 
         self.COMSYM_STATE = 'NORMAL'
         self.comsym_name = None
 
+        self.discarded_name = None
+
         self.LINKERMAP_STATE = 'NORMAL'
         self.linkermap_section = None
         self.linkermap_symbol = None
@@ -48,12 +57,17 @@ class GCCMemoryMapParserSM(object):
 
         self.idep_archives = []
         self.idep_symbols = []
+        self.dependencies = ArchiveDependencyGraph()
+        self.discarded = DiscardedSections()
         self.common_symbols = []
         self.memory_regions = []
 
         self.loaded_files = []
         self.linker_defined_addresses = []
         self.memory_map = GCCMemoryMap(self.ctx)
+        # fpvgcc.incremental.SectionDigests, for parses which can be
+        # updated incrementally
+        self.section_digests = None
 
     def __repr__(self):
         return \
@@ -87,6 +101,16 @@ re_b1_archive = re.compile(
 re_b1_file = re.compile(
     r'^\s+(?P<folder>.*/)?(?P<file>:|(.+?)(?:(\.[^.]*)))\((?P<symbol>.*)\)$'
 )
+# File names may contain spaces. Members always end with the name of the
+# object file in parentheses, and symbols are separated from the file
+# which references them by whitespace.
+re_idep_member = re.compile(
+    r'^(?P<member>[^\s(][^(]*\([^)]*\))'
+    r'(?:\s+(?P<file>\S.*?)\s+\((?P<symbol>[^)]*)\))?\s*$'
+)
+re_idep_reference = re.compile(
+    r'^\s+(?P<file>\S.*?)\s+\((?P<symbol>[^)]*)\)\s*$'
+)
 re_comsym_normal = re.compile(
     r'^(?P<symbol>\S*)\s+(?P<size>0[xX][0-9a-fA-F]+)\s+(?P<filefolder>.*/)?(?P<archivefile>:|.+?(?:\.[^.]*))\((?P<objfile>.*)\)$'
     # noqa
@@ -147,12 +171,28 @@ re_linkermap = {
 }
 
 
+# All the headings are combined into a single regex, with the region key as
+# the group name. Headings always start at the first column with one of a
+# small set of literal characters, so that everything else (indented lines,
+# section names, addresses) can be rejected before the regex is consulted.
+re_headings_combined = re.compile('|'.join(
+    '(?P<{0}>{1})'.format(key, regex.pattern)
+    for key, regex in iteritems(re_headings)
+))
+re_headings_initials = frozenset(
+    regex.pattern[0] for regex in re_headings.values()
+)
+
+
 def check_line_for_heading(l):
-    for key, regex in iteritems(re_headings):
-        if regex.match(l):
-            logging.info("Entering File Region : " + key)
-            return key
-    return None
+    if l[:1] not in re_headings_initials:
+        return None
+    match = re_headings_combined.match(l)
+    if match is None:
+        return None
+    key = match.lastgroup
+    logging.info("Entering File Region : " + key)
+    return key
 
 
 class IDLArchive(object):
@@ -203,6 +243,26 @@ def process_dependencies_line(l, sm):
             sm.idep_symbols.append(symbol)
             sm.IDEP_STATE = 'START'
             sm.idep_archive.becauseof = symbol
+    process_dependency_graph_line(l, sm)
+
+
+def process_dependency_graph_line(l, sm):
+    # The referencing file and symbol follow the member on the same line
+    # if the member name is short enough, or on the next line otherwise.
+    match = re_idep_member.match(l)
+    if match:
+        if match.group('file') is not None:
+            sm.dependencies.add(match.group('member'), match.group('file'),
+                                match.group('symbol'))
+            sm.idep_member = None
+        else:
+            sm.idep_member = match.group('member')
+        return
+    match = re_idep_reference.match(l)
+    if match and sm.idep_member is not None:
+        sm.dependencies.add(sm.idep_member, match.group('file'),
+                            match.group('symbol'))
+        sm.idep_member = None
 
 
 class CommonSymbol(object):
@@ -242,8 +302,29 @@ def process_common_symbols_line(l, sm):
             sm.COMSYM_STATE = 'NORMAL'
 
 
+def add_discarded_section(name, match, sm):
+    arfolder, arfile, objfile = linkermap_symbol_files(match)
+    sm.discarded.append(name, int(match.group('size'), 16), objfile, arfile)
+
+
 def process_discarded_input_section_line(l, sm):
-    pass
+    # Discarded input sections are listed in the same format as the input
+    # sections within the linker map, with long names on a line of their
+    # own.
+    if sm.discarded_name is not None:
+        name = sm.discarded_name
+        sm.discarded_name = None
+        match = re_linkermap['SYMBOLDETAIL'].match(l)
+        if match:
+            add_discarded_section(name, match, sm)
+            return
+    match = re_linkermap['SYMBOL'].match(l)
+    if match:
+        add_discarded_section(match.group('name').strip(), match, sm)
+        return
+    match = re_linkermap['SYMBOLONLY'].match(l)
+    if match:
+        sm.discarded_name = match.group('name').strip()
 
 
 def process_memory_configuration_line(l, sm):
@@ -253,10 +334,10 @@ def process_memory_configuration_line(l, sm):
         sm.memory_map.memory_regions.append(region)
 
 
-def process_linkermap_load_line(l, sm):
-    res = re_linkermap['LOAD'].findall(l)
-    if len(res) and len(res[0]) == 2:
-        sm.loaded_files.append((res[0][0] + res[0][1]).strip())
+def process_linkermap_load_line(match, sm):
+    sm.loaded_files.append(
+        ((match.group('filefolder') or '') + match.group('file')).strip()
+    )
 
 
 class LinkerDefnAddr(object):
@@ -271,20 +352,24 @@ class LinkerDefnAddr(object):
         return r
 
 
-def process_linkermap_defn_addr_line(l, sm):
-    res = re_linkermap['DEFN_ADDR'].findall(l)
-    if len(res) and len(res[0]) == 3:
-        sm.linker_defined_addresses.append(
-            LinkerDefnAddr(res[0][1], res[0][0], res[0][2])
-        )
+def process_linkermap_defn_addr_line(match, sm):
+    sm.linker_defined_addresses.append(
+        LinkerDefnAddr(match.group('name'), match.group('origin'),
+                       match.group('defn'))
+    )
 
 
-def linkermap_name_process(name, sm, checksection=True):
+def linkermap_name_normalize(name):
     name = name.strip()
     if name.startswith('_'):
         name = '.' + name
     if name.startswith('COMMON'):
         name = '.' + name
+    return name
+
+
+def linkermap_name_process(name, sm, checksection=True):
+    name = linkermap_name_normalize(name)
     if name.startswith('*fill*'):
         return '*fill*'
     if not name.startswith('.'):
@@ -343,8 +428,7 @@ def linkermap_get_newnode(name, sm, allow_disambig=True,
     return newnode
 
 
-def process_linkermap_section_headings_line(l, sm):
-    match = re_linkermap['SECTION_HEADINGS'].match(l)
+def process_linkermap_section_headings_line(match, sm):
     name = match.group('name').strip()
     name = linkermap_name_process(name, sm, False)
     if name is None:
@@ -366,8 +450,7 @@ def process_linkermap_section_headings_line(l, sm):
         sm.LINKERMAP_STATE = 'GOT_SECTION_NAME'
 
 
-def process_linkermap_section_heading_detail_line(l, sm):
-    match = re_linkermap['SECTIONDETAIL'].match(l)
+def process_linkermap_section_heading_detail_line(match, sm):
     newnode = sm.linkermap_section
     if match:
         if match.group('address') is not None:
@@ -379,19 +462,8 @@ def process_linkermap_section_heading_detail_line(l, sm):
     sm.LINKERMAP_STATE = 'IN_SECTION'
 
 
-def process_linkermap_symbol_line(l, sm):
-    if sm.linkermap_symbol is not None:
-        logging.warning("Probably Missed Symbol Detail : " +
-                        sm.linkermap_symbol)
-        sm.linkermap_symbol = None
-    match = re_linkermap['SYMBOL'].match(l)
-    name = match.group('name').strip()
-    name = linkermap_name_process(name, sm)
-    if name is None:
-        return
-    if name == '*fill*':
-        sm.linkermap_lastsymbol.fillsize = match.group('size').strip()
-        return
+def linkermap_symbol_files(match):
+    # Returns (arfolder, arfile, objfile) from a SYMBOL or SYMBOLDETAIL match
     arfile = None
     objfile = None
     arfolder = None
@@ -404,6 +476,22 @@ def process_linkermap_symbol_line(l, sm):
         objfile = match.group('file').strip()
         if match.group('filefolder') is not None:
             arfolder = match.group('filefolder').strip()
+    return arfolder, arfile, objfile
+
+
+def process_linkermap_symbol_line(match, sm):
+    if sm.linkermap_symbol is not None:
+        logging.warning("Probably Missed Symbol Detail : " +
+                        sm.linkermap_symbol)
+        sm.linkermap_symbol = None
+    name = match.group('name').strip()
+    name = linkermap_name_process(name, sm)
+    if name is None:
+        return
+    if name == '*fill*':
+        sm.linkermap_lastsymbol.fillsize = match.group('size').strip()
+        return
+    arfolder, arfile, objfile = linkermap_symbol_files(match)
     newnode = linkermap_get_newnode(name, sm, allow_disambig=True,
                                     objfile=objfile)
     if arfile is not None:
@@ -421,27 +509,25 @@ def process_linkermap_symbol_line(l, sm):
     sm.linkermap_lastsymbol = newnode
 
 
-def process_linkermap_fill_line(l, sm):
+def process_linkermap_fill_line(match, sm):
     if sm.linkermap_symbol is not None:
         logging.warning("Probably Missed Symbol Detail : "
                         + sm.linkermap_symbol)
         sm.linkermap_symbol = None
 
     if sm.linkermap_lastsymbol is None or sm.linkermap_symbol is not None:
-        logging.warning("Fill Container Unknown : " + l)
+        logging.warning("Fill Container Unknown : " + match.string)
         return
 
-    match = re_linkermap['FILL'].match(l)
     if match.group('size') is not None:
         sm.linkermap_lastsymbol.fillsize = int(match.group('size').strip(), 16)
 
 
-def process_linkermap_symbolonly_line(l, sm):
+def process_linkermap_symbolonly_line(match, sm):
     if sm.linkermap_symbol is not None:
         logging.warning("Probably Missed Symbol Detail : "
                         + sm.linkermap_symbol)
         sm.linkermap_symbol = None
-    match = re_linkermap['SYMBOLONLY'].match(l)
     name = match.group('name').strip()
     name = linkermap_name_process(name, sm)
     if name is None:
@@ -451,23 +537,11 @@ def process_linkermap_symbolonly_line(l, sm):
     sm.linkermap_symbol = name
 
 
-def process_linkermap_section_detail_line(l, sm):
-    match = re_linkermap['SYMBOLDETAIL'].match(l)
+def process_linkermap_section_detail_line(match, sm):
     name = sm.linkermap_symbol
     if name is None:
         return
-    arfile = None
-    objfile = None
-    arfolder = None
-    if match.group('file2') is not None:
-        arfile = match.group('file').strip()
-        objfile = match.group('file2').strip()
-        if match.group('filefolder') is not None:
-            arfolder = match.group('filefolder').strip()
-    elif match.group('file') is not None:
-        objfile = match.group('file').strip()
-        if match.group('filefolder') is not None:
-            arfolder = match.group('filefolder').strip()
+    arfolder, arfile, objfile = linkermap_symbol_files(match)
     newnode = linkermap_get_newnode(name, sm,
                                     allow_disambig=True, objfile=objfile)
     if arfile is not None:
@@ -486,15 +560,20 @@ def process_linkermap_section_detail_line(l, sm):
     sm.linkermap_symbol = None
 
 
-def process_linkaliases_line(l, sm):
-    match = re_linkermap['LINKALIASES'].match(l)
-    alias_list = match.group(1).split(' ')
-    # print alias_list, linkermap_section.gident
-    for alias in alias_list:
+def linkaliases_list(match):
+    aliases = []
+    for alias in match.group(1).split(' '):
         if alias.endswith('*'):
             alias = alias[:-1]
         if alias.endswith('.'):
             alias = alias[:-1]
+        aliases.append(alias)
+    return aliases
+
+
+def process_linkaliases_line(match, sm):
+    # print alias_list, linkermap_section.gident
+    for alias in linkaliases_list(match):
         if sm.linkermap_section is not None and \
                 alias == sm.linkermap_section.gident:
             continue
@@ -507,63 +586,146 @@ def process_linkaliases_line(l, sm):
             logging.warning("Target for alias unknown : " + alias)
 
 
+def process_linkermap_unhandled_line(match, sm):
+    logging.error("Unhandled line in linkerm : {0}".format(
+        match.string.strip()))
+
+
+def linkermap_line_key(l):
+    # Cheap classification of a linker map line using only its first few
+    # characters. The key selects the (short) list of candidate regexes
+    # from the dispatch tables below, so that most lines are matched
+    # against exactly one regex.
+    c = l[0]
+    if c == '.' or c == '_':
+        return 'SECTION'
+    if c.isspace():
+        c = l[1:2]
+        if not c or c.isspace():
+            return 'INDENTED'
+        if c == '*':
+            if l.startswith('*fill*', 1):
+                return 'FILL'
+            return 'ALIASES'
+        if (c == '.' or c == '_') and l.find(' ', 2) == -1:
+            return 'SYMBOLONLY'
+        return 'SYMBOL'
+    if l.startswith('LOAD'):
+        return 'LOAD'
+    return None
+
+
+# Lines which are recognized within the linker map, but which carry no
+# information which is presently used.
+re_linkermap_ignored = re.compile('|'.join(
+    '(?:{0})'.format(re_linkermap[key].pattern)
+    for key in ('ALIGN', 'VECTOR_ISR', 'g_pfnVectors',
+                'SYMBOLSIMPLE', 'FUNCTION')
+))
+
+# Dispatch tables for the linker map, for each LINKERMAP_STATE. Each line
+# key maps to an ordered tuple of (regex, handler) candidates. The first
+# candidate which matches wins, and its match object is handed to the
+# handler. A handler of None indicates a recognized line to be ignored.
+# Lines matched by a candidate with process_linkermap_unhandled_line are
+# logged, and the candidates after it are still tried.
+
+# Lines outside of output sections are few, and are tried against every
+# regex in turn regardless of their key, logging those which match but are
+# not handled.
+_linkermap_normal_handlers = {
+    'LOAD': process_linkermap_load_line,
+    'DEFN_ADDR': process_linkermap_defn_addr_line,
+    'SECTION_HEADINGS': process_linkermap_section_headings_line,
+    'SYMBOLSIMPLE': None,
+}
+_linkermap_normal_candidates = tuple(
+    (regex, _linkermap_normal_handlers.get(
+        key, process_linkermap_unhandled_line))
+    for key, regex in iteritems(re_linkermap)
+)
+linkermap_dispatch_normal = dict(
+    (key, _linkermap_normal_candidates)
+    for key in ('LOAD', 'SECTION', 'INDENTED', 'FILL', 'ALIASES', 'SYMBOL',
+                'SYMBOLONLY', None)
+)
+
+linkermap_dispatch_in_section = {
+    'SECTION': (
+        (re_linkermap['SECTION_HEADINGS'],
+         process_linkermap_section_headings_line),
+    ),
+    'INDENTED': (
+        (re_linkermap_ignored, None),
+    ),
+    'FILL': (
+        (re_linkermap['FILL'], process_linkermap_fill_line),
+        (re_linkermap['SYMBOL'], process_linkermap_symbol_line),
+    ),
+    'ALIASES': (
+        (re_linkermap['LINKALIASES'], process_linkaliases_line),
+        (re_linkermap['SYMBOL'], process_linkermap_symbol_line),
+    ),
+    'SYMBOL': (
+        (re_linkermap['SYMBOL'], process_linkermap_symbol_line),
+        (re_linkermap['SYMBOLONLY'], process_linkermap_symbolonly_line),
+        (re_linkermap_ignored, None),
+    ),
+    'SYMBOLONLY': (
+        (re_linkermap['SYMBOLONLY'], process_linkermap_symbolonly_line),
+        (re_linkermap['SYMBOL'], process_linkermap_symbol_line),
+    ),
+}
+
+
+def dispatch_linkermap_line(l, sm, table):
+    matched = False
+    for regex, handler in table.get(linkermap_line_key(l), ()):
+        match = regex.match(l)
+        if match:
+            matched = True
+            if handler is process_linkermap_unhandled_line:
+                handler(match, sm)
+                continue
+            if handler is not None:
+                handler(match, sm)
+            return True
+    return matched
+
+
 def process_linkermap_line(l, sm):
     if sm.LINKERMAP_STATE == 'GOT_SECTION_NAME':
-        process_linkermap_section_heading_detail_line(l, sm)
+        process_linkermap_section_heading_detail_line(
+            re_linkermap['SECTIONDETAIL'].match(l), sm
+        )
     elif sm.LINKERMAP_STATE == 'NORMAL':
-        for key, regex in iteritems(re_linkermap):
-            if regex.match(l):
-                if key == 'LOAD':
-                    process_linkermap_load_line(l, sm)
-                    return
-                if key == 'DEFN_ADDR':
-                    process_linkermap_defn_addr_line(l, sm)
-                    return
-                if key == 'SECTION_HEADINGS':
-                    process_linkermap_section_headings_line(l, sm)
-                    return
-                if key == 'SYMBOLSIMPLE':
-                    # process_linkermap_symbol_line(l, sm)
-                    return
-                logging.error(
-                    "Unhandled line in linkerm : {0}".format(l.strip()))
+        dispatch_linkermap_line(l, sm, linkermap_dispatch_normal)
     elif sm.LINKERMAP_STATE == 'IN_SECTION':
         if sm.linkermap_symbol is not None:
-            if re_linkermap['SYMBOLDETAIL'].match(l):
-                process_linkermap_section_detail_line(l, sm)
+            match = re_linkermap['SYMBOLDETAIL'].match(l)
+            if match:
+                process_linkermap_section_detail_line(match, sm)
                 return
-        if re_linkermap['SECTION_HEADINGS'].match(l):
-            process_linkermap_section_headings_line(l, sm)
-            return
-        if re_linkermap['FILL'].match(l):
-            process_linkermap_fill_line(l, sm)
-            return
-        if re_linkermap['LINKALIASES'].match(l):
-            process_linkaliases_line(l, sm)
-            return
-        if re_linkermap['SYMBOL'].match(l):
-            process_linkermap_symbol_line(l, sm)
-            return
-        if re_linkermap['SYMBOLONLY'].match(l):
-            process_linkermap_symbolonly_line(l, sm)
-            return
-        if re_linkermap['ALIGN'].match(l):
-            return
-        if re_linkermap['VECTOR_ISR'].match(l):
-            return
-        if re_linkermap['g_pfnVectors'].match(l):
-            return
-        if re_linkermap['SYMBOLSIMPLE'].match(l):
-            # process_linkermap_symbol_line(l, sm)
-            return
-        if re_linkermap['FUNCTION'].match(l):
-            return
-        logging.warning("Unhandled line in section : {0}".format(l.strip()))
+        if not dispatch_linkermap_line(l, sm, linkermap_dispatch_in_section):
+            logging.warning(
+                "Unhandled line in section : {0}".format(l.strip()))
     return None
 
 
-def cleanup_and_pack_map(sm):
-    for node in sm.memory_map.root.all_nodes():
+# Map files read in binary mode, by the readers which need byte offsets
+# into the file, are decoded a line at a time and parsed as text.
+map_encoding = 'utf-8'
+
+
+def decode_map_line(line):
+    if line.endswith(b'\r\n'):
+        # Text mode reads would have translated these
+        line = line[:-2] + b'\n'
+    return line.decode(map_encoding, 'replace')
+
+
+def cleanup_and_pack_nodes(nodes):
+    for node in nodes:
         if len(node.children) > 0:
             logging.warning('Force clearing leaf size for intermediate node'
                             ' : {0}'.format(node.gident))
@@ -571,34 +733,92 @@ def cleanup_and_pack_map(sm):
             node.fillsize = 0
 
 
-def process_map_file(fname, profile=None):
-    if profile is None:
-        profile = get_profile('default')
-    elif profile == 'auto':
-        profile = guess_profile(fname)
+def cleanup_and_pack_map(sm):
+    cleanup_and_pack_nodes(sm.memory_map.root.all_nodes())
+    sm.memory_map.resolve_regions()
+
+
+def process_map_line(line, sm):
+    if not line.strip():
+        return
+    rval = check_line_for_heading(line)
+    if rval is not None:
+        sm.state = rval
+    else:
+        if sm.state == 'IN_DEPENDENCIES':
+            process_dependencies_line(line, sm)
+        elif sm.state == 'IN_COMMON_SYMBOLS':
+            process_common_symbols_line(line, sm)
+        elif sm.state == 'IN_DISCARDED_INPUT_SECTIONS':
+            process_discarded_input_section_line(line, sm)
+        elif sm.state == 'IN_MEMORY_CONFIGURATION':
+            process_memory_configuration_line(line, sm)
+        elif sm.state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
+            process_linkermap_line(line, sm)
+
+
+def process_map_line_b(line, sm):
+    process_map_line(decode_map_line(line), sm)
+
+
+@contextmanager
+def mmap_lines(fname):
+    if compression_type(fname) is not None:
+        with open_map_file(fname, binary=True) as f:
+            yield f
+        return
+    with open(fname, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield iter(())
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield iter(buf.readline, b'')
+        finally:
+            buf.close()
+
+
+def _process_map_file(fname, profile, use_mmap=False, jobs=None):
+    if jobs is not None and jobs > 1:
+        from .parallel import process_map_file_parallel
+        sm = process_map_file_parallel(fname, profile, jobs)
+        if sm is not None:
+            return sm
     sm = GCCMemoryMapParserSM(ctx=profile)
-    with open(fname) as f:
-        for line in f:
-            if not line.strip():
-                continue
-            rval = check_line_for_heading(line)
-            if rval is not None:
-                sm.state = rval
-            else:
-                if sm.state == 'IN_DEPENDENCIES':
-                    process_dependencies_line(line, sm)
-                elif sm.state == 'IN_COMMON_SYMBOLS':
-                    process_common_symbols_line(line, sm)
-                elif sm.state == 'IN_DISCARDED_INPUT_SECTIONS':
-                    process_discarded_input_section_line(line, sm)
-                elif sm.state == 'IN_MEMORY_CONFIGURATION':
-                    process_memory_configuration_line(line, sm)
-                elif sm.state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
-                    process_linkermap_line(line, sm)
+    if use_mmap:
+        with mmap_lines(fname) as lines:
+            for line in lines:
+                process_map_line_b(line, sm)
+    else:
+        with open_map_file(fname) as f:
+            for line in f:
+                process_map_line(line, sm)
     cleanup_and_pack_map(sm)
     return sm
 
 
+def resolve_profile(fname, profile):
+    if profile is None:
+        return get_profile('default')
+    elif profile == 'auto':
+        return get_profile(guess_profile(fname))
+    return profile
+
+
+def process_map_file(fname, profile=None, use_mmap=False, jobs=None,
+                     cache_dir=None):
+    profile = resolve_profile(fname, profile)
+    if cache_dir is None:
+        return _process_map_file(fname, profile, use_mmap, jobs)
+    from .cache import MapCache
+    cache = MapCache(cache_dir)
+    sm = cache.get(fname, profile)
+    if sm is None:
+        sm = _process_map_file(fname, profile, use_mmap, jobs)
+        cache.put(fname, profile, sm)
+    return sm
+
+
 if __name__ == '__main__':
     from .cli import main
 
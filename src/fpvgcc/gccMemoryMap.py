@@ -19,14 +19,33 @@
 
 
 import logging
-from functools import cached_property
+import sys
+from bisect import bisect_right
 
+from fpvgcc.columnar import MapColumns
 from fpvgcc.datastructures.ntreeSize import SizeNTree, SizeNTreeNode
+from fpvgcc.datastructures.strings import StringTable
+from fpvgcc.pivot import FootprintPivots
 
 
 class LinkAliases(object):
+    # Aliases are also held in a character trie, so that encode finds the
+    # longest registered alias which prefixes a name in time proportional
+    # to the length of the name rather than the number of aliases. The
+    # target of an alias is stored in its terminal trie node under the
+    # empty string key.
+    _terminal = ''
+
     def __init__(self):
         self._aliases = {}
+        self._trie = {}
+
+    def _add(self, alias, target):
+        self._aliases[alias] = target
+        node = self._trie
+        for c in alias:
+            node = node.setdefault(c, {})
+        node[self._terminal] = target
 
     def register_alias(self, target, alias):
         if alias in self._aliases.keys():
@@ -34,15 +53,31 @@ class LinkAliases(object):
                 logging.warning("Alias Collision : {0} :: {1} ; {2}"
                                 "".format(alias, target, self._aliases[alias]))
         else:
-            self._aliases[alias] = target
+            self._add(alias, target)
+
+    def items(self):
+        return list(self._aliases.items())
+
+    def load(self, items):
+        # Restore (alias, target) pairs, as returned by items(), preserving
+        # their order. Existing aliases take precedence, as they would with
+        # register_alias.
+        for alias, target in items:
+            if alias not in self._aliases:
+                self._add(alias, target)
 
     def encode(self, name):
-        for key in self._aliases.keys():
-            if name.startswith(key):
-                # if alias.startswith(linkermap_section.gident):
-                # alias = alias[len(linkermap_section.gident):]
-                return self._aliases[key] + name
-        return name
+        node = self._trie
+        # An alias for the empty prefix applies to every name
+        target = node.get(self._terminal)
+        for c in name:
+            node = node.get(c)
+            if node is None:
+                break
+            target = node.get(self._terminal, target)
+        if target is None:
+            return name
+        return target + name
 
     def __repr__(self):
         return '\n'.join(["{0:>38} -> {1:<38}".format(a, t)
@@ -50,7 +85,30 @@ class LinkAliases(object):
                                                key=lambda x: x[1])])
 
 
+_string_slots = ('_arfolder', '_arfile', '_objfile')
+
+
+def _string_property(slot):
+    # File and folder names are held as ids in the string table of the
+    # memory map. Nodes which are not part of a memory map hold them as is.
+    def fget(self):
+        value = getattr(self, slot)
+        if value.__class__ is int:
+            return self.tree.strings[value]
+        return value
+
+    def fset(self, value):
+        strings = self._string_table()
+        if strings is not None:
+            value = strings.intern(value)
+        setattr(self, slot, value)
+
+    return property(fget, fset)
+
+
 class GCCMemoryMapNode(SizeNTreeNode):
+    __slots__ = ('name', '_address', '_defsize', '_size', '_fillsize',
+                 '_region') + _string_slots
     _leaf_property = '_size'
     _ident_property = 'name'
 
@@ -59,12 +117,15 @@ class GCCMemoryMapNode(SizeNTreeNode):
                  arfile=None, objfile=None, arfolder=None):
         super(GCCMemoryMapNode, self).__init__(parent, node_t)
         self._size = None
+        # Code of the region in the region table of the memory map, once
+        # it has been resolved.
+        self._region = None
         if name is None:
             if objfile is not None:
                 name = objfile
             else:
                 name = ""
-        self.name = name
+        self.name = sys.intern(name)
         if address is not None:
             self._address = int(address, 16)
         else:
@@ -79,9 +140,19 @@ class GCCMemoryMapNode(SizeNTreeNode):
         self._fillsize = None
         self.fillsize = fillsize
 
-    @cached_property
+    @property
     def ctx(self):
-        return self.parent.ctx
+        return self.tree.ctx
+
+    arfolder = _string_property('_arfolder')
+    arfile = _string_property('_arfile')
+    objfile = _string_property('_objfile')
+
+    def _string_table(self):
+        tree = self._tree
+        if tree is None:
+            return None
+        return tree.strings
 
     @property
     def address(self):
@@ -93,14 +164,14 @@ class GCCMemoryMapNode(SizeNTreeNode):
     @address.setter
     def address(self, value):
         self._address = int(value, 16)
+        self._touch_tree(structure=False)
 
     def contains_address(self, addr):
-        if not self.address or self.region in ['DISCARDED', 'UNDEF']:
+        if not isinstance(addr, int):
+            addr = int(addr, 0)
+        if self._address is None or self.region in ['DISCARDED', 'UNDEF']:
             return False
-        if int(self.address, 0) <= int(addr, 0) < \
-                (int(self.address, 0) + self.size):
-            return True
-        return False
+        return self._address <= addr < self._address + self.size
 
     @property
     def defsize(self):
@@ -130,6 +201,7 @@ class GCCMemoryMapNode(SizeNTreeNode):
                 logging.warning("Possibly missing leaf node "
                                 "with same name : {0}".format(self.gident))
         self._size = newsize
+        self.invalidate_size()
 
     @property
     def fillsize(self):
@@ -144,17 +216,32 @@ class GCCMemoryMapNode(SizeNTreeNode):
                 self._fillsize = int(value)
         else:
             self._fillsize = 0
+        self.invalidate_size()
 
     def add_child(self, newchild=None, name=None,
                   address=None, size=None, fillsize=0,
                   arfile=None, objfile=None, arfolder=None):
         if newchild is None:
-            nchild = GCCMemoryMapNode(name=name, address=None, size=None,
-                                      fillsize=0, arfile=None, objfile=None,
-                                      arfolder=None)
-            newchild = super(GCCMemoryMapNode, self).add_child(nchild)
-        else:
-            newchild = super(GCCMemoryMapNode, self).add_child(newchild)
+            newchild = GCCMemoryMapNode(name=name, address=None, size=None,
+                                        fillsize=0, arfile=None,
+                                        objfile=None, arfolder=None)
+        old = newchild._string_table()
+        newchild = super(GCCMemoryMapNode, self).add_child(newchild)
+        new = self._string_table()
+        if new is not old:
+            # Move the names of the files in the subtree into the string
+            # table of the memory map it is now a part of
+            stack = [newchild]
+            while stack:
+                node = stack.pop()
+                for slot in _string_slots:
+                    value = getattr(node, slot)
+                    if value.__class__ is int:
+                        value = old[value]
+                    if new is not None:
+                        value = new.intern(value)
+                    setattr(node, slot, value)
+                stack.extend(node.children)
         return newchild
 
     def push_to_leaf(self):
@@ -182,6 +269,7 @@ class GCCMemoryMapNode(SizeNTreeNode):
         newleaf.osize = hex(self._size)
 
         self._size = None
+        self.invalidate_size()
         self._defsize = None
         if not self.is_toplevelnode:
             self._address = None
@@ -205,26 +293,38 @@ class GCCMemoryMapNode(SizeNTreeNode):
     def leafsize(self, value):
         raise AttributeError
 
-    @cached_property
+    @property
     def region(self):
-        ctx = self.ctx
-        if not isinstance(self.parent, GCCMemoryMap) and \
-                self.parent.region == 'DISCARDED':
-            return 'DISCARDED'
+        code = self._region
+        if code is None:
+            parent = self.parent
+            if not isinstance(parent, GCCMemoryMap):
+                # Raises ValueError if the parent is not in any region
+                parent.region
+                code = self._resolve_region(parent._region)
+            else:
+                code = self._resolve_region(None)
+            self._region = code
+        return self.tree.region_names[code]
+
+    def _resolve_region(self, parent):
+        # Code of the region of the node, given that of its parent
+        tree = self.tree
+        ctx = tree.ctx
+        if parent is not None and tree.region_names[parent] == 'DISCARDED':
+            return parent
         # Suppressed root identifiers for MSP430 GCC. A better mechanism to
         # provide user access to manipulate this set is needed.
         if ctx and self.name in ctx.suppressed_names:
-            return 'DISCARDED'
+            return tree.region_code('DISCARDED')
         if self._address is None:
-            return 'UNDEF'
+            return tree.region_code('UNDEF')
         if self._address == 0:
-            return "DISCARDED"
-        for region in self.tree.memory_regions:
-            if self._address in region:
-                if region.name in ctx.suppressed_regions:
-                    return 'DISCARDED'
-                return region.name
-        raise ValueError(self._address)
+            return tree.region_code('DISCARDED')
+        code = tree.region_index.lookup(self._address)
+        if code is None:
+            raise ValueError(self._address)
+        return code
 
     @property
     def is_leaf_property_set(self):
@@ -243,17 +343,138 @@ class GCCMemoryMap(SizeNTree):
     # much an example of what NOT to do.
     node_t = GCCMemoryMapNode
     collapse_vectors = True
+    # Answer footprint queries from a MapColumns table of the map
+    columnar = False
 
     def __init__(self, ctx):
         self.ctx = ctx
         self.memory_regions = []
+        # Names of the regions nodes have been found to be in. Nodes hold
+        # the index of their region in this table.
+        self.region_names = []
+        self._region_codes = {}
+        self._region_index = None
+        self._address_index = None
+        self._pivots = None
+        # name -> ((generation, collapse_vectors), value) of derived lists
+        self._derived = {}
         self._vector_regions = []
         self._vector_sections = []
         self.aliases = LinkAliases()
+        # Names of the files and folders of nodes, which hold their ids
+        self.strings = StringTable()
+        self._columns = None
         super(GCCMemoryMap, self).__init__()
 
+    def region_code(self, name):
+        try:
+            return self._region_codes[name]
+        except KeyError:
+            self._region_codes[name] = len(self.region_names)
+            self.region_names.append(name)
+            return self._region_codes[name]
+
+    @property
+    def region_index(self):
+        """
+        :class:`MemoryRegionIndex` of the memory regions of the map, built
+        again if regions have been added since.
+        """
+        index = self._region_index
+        if index is None or index.regions is not self.memory_regions or \
+                index.count != len(self.memory_regions):
+            index = self._region_index = MemoryRegionIndex(self)
+        return index
+
+    @property
+    def address_index(self):
+        """
+        :class:`AddressIndex` of the nodes of the map, built again after
+        the map changes.
+        """
+        index = self._address_index
+        if index is None or index.generation != self.generation:
+            index = self._address_index = AddressIndex(self)
+        return index
+
+    def resolve_regions(self, node=None):
+        """
+        Find the regions of all the nodes in the subtree of a node, by
+        default the root, in a single pass from the top down. Nodes which
+        are not in any region, and their subtrees, are left as they are.
+        """
+        if node is None:
+            node = self.root
+        try:
+            node.region
+        except ValueError:
+            return
+        stack = [node]
+        while stack:
+            parent = stack.pop()
+            for child in parent.children:
+                if child._region is None:
+                    try:
+                        child._region = child._resolve_region(parent._region)
+                    except ValueError:
+                        continue
+                stack.append(child)
+
+    @property
+    def columns(self):
+        """
+        :class:`fpvgcc.columnar.MapColumns` of the map, if the map is
+        columnar and the regions of all its nodes are known. Otherwise,
+        None.
+        """
+        if not self.columnar:
+            return None
+        columns = self._columns
+        if columns is None or columns.generation != self.generation:
+            columns = self._columns = MapColumns(self)
+        if not columns.complete:
+            return None
+        return columns
+
+    @property
+    def pivots(self):
+        """
+        :class:`fpvgcc.pivot.FootprintPivots` of the map, built again after
+        the map changes.
+        """
+        pivots = self._pivots
+        if pivots is None or pivots.generation != self.generation:
+            pivots = self._pivots = FootprintPivots(self)
+        return pivots
+
+    def _region_pivots(self):
+        # Pivots to answer footprints by region from, unless the columns of
+        # the map are to be used or some regions are unknown
+        if self.columnar:
+            return None
+        pivots = self.pivots
+        if not pivots.complete:
+            return None
+        return pivots
+
+    def _derived_value(self, name, compute):
+        # Lists derived from the whole map are kept until it changes, and
+        # are shared with all callers until then. They must not be
+        # modified. The key is taken after computing them, which loads
+        # lazily parsed maps.
+        entry = self._derived.get(name)
+        if entry is None or \
+                entry[0] != (self.generation, self.collapse_vectors):
+            value = compute()
+            entry = (self.generation, self.collapse_vectors), value
+            self._derived[name] = entry
+        return entry[1]
+
     @property
     def used_regions(self):
+        return self._derived_value('used_regions', self._used_regions)
+
+    def _used_regions(self):
         ur = ['UNDEF']
         if self.collapse_vectors:
             self._vector_regions = []
@@ -272,56 +493,64 @@ class GCCMemoryMap(SizeNTree):
         ur.remove('DISCARDED')
         return ur
 
+    # File names are compared by their ids in the string table, with 0
+    # standing for None. Names which are not in the table match no nodes.
+
+    def _file_id(self, name):
+        return self.strings.id(name)
+
+    def _file_names(self, ids):
+        return [self.strings[x] for x in ids]
+
     @property
     def used_objfiles(self):
-        of = []
+        of = {}
         for node in self.root.all_nodes():
             region = node.region
-            if node.objfile is None and node.leafsize \
+            if not node._objfile and node.leafsize \
                     and region not in ['DISCARDED', 'UNDEF']:
                 logging.warning(
                     "Object unaccounted for : {0:<40} {1:<15} {2:>5}"
                     "".format(node.gident, region, str(node.leafsize))
                 )
                 continue
-            if node.objfile not in of:
-                of.append(node.objfile)
-        return of
+            of.setdefault(node._objfile)
+        return self._file_names(of)
 
     def arfile_objfiles(self, arfile):
-        of = []
+        aid = self._file_id(arfile)
+        of = {}
         for node in self.root.all_nodes():
             if node.leafsize and node.region not in ['DISCARDED', 'UNDEF']:
                 continue
-            if node.arfile == arfile and node.objfile not in of:
-                of.append(node.objfile)
-        return of
+            if node._arfile == aid:
+                of.setdefault(node._objfile)
+        return self._file_names(of)
 
     @property
     def used_arfiles(self):
-        af = []
+        af = {}
         for node in self.root.all_nodes():
             region = node.region
-            if node.arfile is None and node.leafsize \
+            if not node._arfile and node.leafsize \
                     and region not in ['DISCARDED', 'UNDEF']:
                 logging.warning(
                     "Object unaccounted for : {0:<40} {1:<15} {2:>5}"
                     "".format(node.gident, region, str(node.leafsize))
                 )
                 continue
-            if node.arfile not in af:
-                af.append(node.arfile)
-        return af
+            af.setdefault(node._arfile)
+        return self._file_names(af)
 
     @property
     def used_files(self):
-        af = []
-        of = []
+        af = {}
+        of = {}
         for node in self.root.all_nodes():
             region = node.region
-            if node.arfile is None and node.leafsize \
+            if not node._arfile and node.leafsize \
                     and region not in ['DISCARDED', 'UNDEF']:
-                if node.objfile is None and node.leafsize \
+                if not node._objfile and node.leafsize \
                         and region not in ['DISCARDED', 'UNDEF']:
                     logging.warning(
                         "Object unaccounted for : {0:<40} {1:<15} {2:>5}"
@@ -329,18 +558,17 @@ class GCCMemoryMap(SizeNTree):
                     )
                     continue
                 else:
-                    if node.objfile not in of:
-                        of.append(node.objfile)
-            if node.arfile not in af:
-                af.append(node.arfile)
-        if None in af:
-            af.remove(None)
-        if None in of:
-            of.remove(None)
-        return of, af
+                    of.setdefault(node._objfile)
+            af.setdefault(node._arfile)
+        af.pop(0, None)
+        of.pop(0, None)
+        return self._file_names(of), self._file_names(af)
 
     @property
     def used_sections(self):
+        return self._derived_value('used_sections', self._used_sections)
+
+    def _used_sections(self):
         sections = [node.gident for node in self.top_level_nodes
                     if node.size > 0 and
                     node.region not in ['DISCARDED', 'UNDEF']]
@@ -355,28 +583,36 @@ class GCCMemoryMap(SizeNTree):
 
     @property
     def all_symbols(self):
-        asym = []
+        asym = {}
         for node in self.root.all_nodes():
-            if node.name not in asym:
-                asym.append(node.name)
-        return asym
+            asym.setdefault(node.name)
+        return list(asym)
 
     def symbols_from_file(self, lfile):
-        fsym = []
+        fid = self._file_id(lfile)
+        fsym = {}
         for node in self.root.all_nodes():
-            if node.name not in fsym and lfile in [node.objfile, node.arfile]:
-                fsym.append(node.name)
-        return fsym
-
-    def get_symbol_fp(self, symbol):
+            if fid == node._objfile or fid == node._arfile:
+                fsym.setdefault(node.name)
+        return list(fsym)
+
+    def get_symbol_fp(self, symbol, regions=None):
+        if regions is None:
+            regions = self.used_regions
+        pivots = self._region_pivots()
+        if pivots is not None:
+            return pivots.symbol_fp(symbol, regions)
         r = []
-        for rgn in self.used_regions:
+        for rgn in regions:
             r.append(self.get_symbol_fp_rgn(symbol, rgn))
         return r
 
     def get_symbol_fp_rgn(self, symbol, region):
         if self.collapse_vectors and region == "VEC":
             return self.get_symbol_fp_rgnvec(symbol)
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_rgn('name', symbol, region)
         rv = 0
         for node in self.root.all_nodes():
             if node.name == symbol:
@@ -386,6 +622,9 @@ class GCCMemoryMap(SizeNTree):
         return rv
 
     def get_symbol_fp_rgnvec(self, symbol):
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_rgn('name', symbol, None)
         rv = 0
         for node in self.root.all_nodes():
             if node.name == symbol:
@@ -394,103 +633,156 @@ class GCCMemoryMap(SizeNTree):
                         rv += node.leafsize
         return rv
 
-    def get_objfile_fp(self, objfile):
+    def get_objfile_fp(self, objfile, regions=None):
+        if regions is None:
+            regions = self.used_regions
+        pivots = self._region_pivots()
+        if pivots is not None:
+            return pivots.objfile_fp(objfile, regions)
         r = []
-        for rgn in self.used_regions:
+        for rgn in regions:
             r.append(self.get_objfile_fp_rgn(objfile, rgn))
         return r
 
     def get_objfile_fp_rgn(self, objfile, region):
         if self.collapse_vectors and region == "VEC":
             return self.get_objfile_fp_rgnvec(objfile)
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_rgn('objfile', objfile, region)
+        fid = self._file_id(objfile)
         rv = 0
         for node in self.root.all_nodes():
-            if node.objfile == objfile:
+            if node._objfile == fid:
                 if node.region == region:
                     if node.leafsize is not None:
                         rv += node.leafsize
         return rv
 
     def get_objfile_fp_rgnvec(self, objfile):
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_rgn('objfile', objfile, None)
+        fid = self._file_id(objfile)
         rv = 0
         for node in self.root.all_nodes():
-            if node.objfile == objfile:
+            if node._objfile == fid:
                 if 'VEC' in node.region:
                     if node.leafsize is not None:
                         rv += node.leafsize
         return rv
 
-    def get_objfile_fp_secs(self, objfile):
+    def get_objfile_fp_secs(self, objfile, sections=None):
+        if sections is None:
+            sections = self.used_sections
+        if not self.columnar:
+            return self.pivots.objfile_fp_secs(objfile, sections)
         r = []
-        for section in self.used_sections:
+        for section in sections:
             r.append(self.get_objfile_fp_sec(objfile, section))
         return r
 
-    def get_arfile_fp_secs(self, arfile):
+    def get_arfile_fp_secs(self, arfile, sections=None):
+        if sections is None:
+            sections = self.used_sections
+        if not self.columnar:
+            return self.pivots.arfile_fp_secs(arfile, sections)
         r = []
-        for section in self.used_sections:
+        for section in sections:
             r.append(self.get_arfile_fp_sec(arfile, section))
         return r
 
     def get_objfile_fp_sec(self, objfile, section):
         if section == '.*vec*':
             return self.get_objfile_fp_secvec(objfile)
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_subtree('objfile', objfile,
+                                      self.get_node(section))
+        fid = self._file_id(objfile)
         rv = 0
         for node in self.get_node(section).all_nodes():
-            if node.objfile == objfile:
+            if node._objfile == fid:
                 if node.leafsize is not None:
                     rv += node.leafsize
         return rv
 
     def get_objfile_fp_secvec(self, objfile):
+        columns = self.columns
+        if columns is not None:
+            return sum(columns.fp_subtree('objfile', objfile, self.get_node(x))
+                       for x in self._vector_sections)
+        fid = self._file_id(objfile)
         rv = 0
         for section in self._vector_sections:
             for node in self.get_node(section).all_nodes():
-                if node.objfile == objfile:
+                if node._objfile == fid:
                     if node.leafsize is not None:
                         rv += node.leafsize
         return rv
 
     def get_arfile_fp_sec(self, arfile, section):
         if section == '.*vec*':
-            return self.get_objfile_fp_secvec(arfile)
+            return self.get_arfile_fp_secvec(arfile)
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_subtree('arfile', arfile, self.get_node(section))
+        fid = self._file_id(arfile)
         rv = 0
         for node in self.get_node(section).all_nodes():
-            if node.arfile == arfile:
+            if node._arfile == fid:
                 if node.leafsize is not None:
                     rv += node.leafsize
         return rv
 
     def get_arfile_fp_secvec(self, arfile):
+        columns = self.columns
+        if columns is not None:
+            return sum(columns.fp_subtree('arfile', arfile, self.get_node(x))
+                       for x in self._vector_sections)
+        fid = self._file_id(arfile)
         rv = 0
         for section in self._vector_sections:
             for node in self.get_node(section).all_nodes():
-                if node.arfile == arfile:
+                if node._arfile == fid:
                     if node.leafsize is not None:
                         rv += node.leafsize
         return rv
 
-    def get_arfile_fp(self, arfile):
+    def get_arfile_fp(self, arfile, regions=None):
+        if regions is None:
+            regions = self.used_regions
+        pivots = self._region_pivots()
+        if pivots is not None:
+            return pivots.arfile_fp(arfile, regions)
         r = []
-        for rgn in self.used_regions:
+        for rgn in regions:
             r.append(self.get_arfile_fp_rgn(arfile, rgn))
         return r
 
     def get_arfile_fp_rgn(self, arfile, region):
         if self.collapse_vectors and region == "VEC":
             return self.get_arfile_fp_rgnvec(arfile)
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_rgn('arfile', arfile, region)
+        fid = self._file_id(arfile)
         rv = 0
         for node in self.root.all_nodes():
-            if node.arfile == arfile:
+            if node._arfile == fid:
                 if node.region == region:
                     if node.leafsize is not None:
                         rv += node.leafsize
         return rv
 
     def get_arfile_fp_rgnvec(self, arfile):
+        columns = self.columns
+        if columns is not None:
+            return columns.fp_rgn('arfile', arfile, None)
+        fid = self._file_id(arfile)
         rv = 0
         for node in self.root.all_nodes():
-            if node.arfile == arfile:
+            if node._arfile == fid:
                 if 'VEC' in node.region:
                     if node.leafsize is not None:
                         rv += node.leafsize
@@ -517,3 +809,119 @@ class MemoryRegion(object):
             return True
         else:
             return False
+
+
+class MemoryRegionIndex(object):
+    """
+    The memory regions of a map, as sorted intervals of addresses which
+    each lie in a single region, or in none. Where regions overlap, the one
+    listed first in the map file takes the addresses, as in a scan of the
+    regions in order. Regions suppressed by the toolchain profile resolve
+    to ``DISCARDED``.
+    """
+    def __init__(self, mm):
+        self.regions = mm.memory_regions
+        self.count = len(self.regions)
+        if mm.ctx is not None:
+            suppressed = mm.ctx.suppressed_regions
+        else:
+            suppressed = ()
+        bounds = set()
+        for region in self.regions:
+            bounds.add(region.origin)
+            bounds.add(region.origin + region.size)
+        # Region code of the addresses from each start to the next
+        self.starts = []
+        self.codes = []
+        for start in sorted(bounds):
+            for region in self.regions:
+                if start in region:
+                    if region.name in suppressed:
+                        code = mm.region_code('DISCARDED')
+                    else:
+                        code = mm.region_code(region.name)
+                    break
+            else:
+                code = None
+            if self.codes and self.codes[-1] == code:
+                continue
+            self.starts.append(start)
+            self.codes.append(code)
+
+    def lookup(self, address):
+        """
+        :return: The region code of an address, or None if it is not in
+                 any region.
+        """
+        idx = bisect_right(self.starts, address) - 1
+        if idx < 0:
+            return None
+        return self.codes[idx]
+
+
+class AddressIndex(object):
+    """
+    The nodes of a map which occupy memory, as sorted intervals of
+    addresses each of which is covered by the same nodes throughout. Nodes
+    which are discarded, have no address or size, or are not in any memory
+    region are left out, as they are by
+    :meth:`GCCMemoryMapNode.contains_address`.
+    """
+    def __init__(self, mm):
+        nodes = mm.root.all_nodes()
+        # Taken after the traversal, which loads lazily parsed maps
+        self.generation = mm.generation
+        starts = {}
+        ends = {}
+        for idx, node in enumerate(nodes):
+            if node._address is None:
+                continue
+            try:
+                if node.region in ['DISCARDED', 'UNDEF']:
+                    continue
+            except ValueError:
+                continue
+            size = node.size
+            if not isinstance(size, int) or size <= 0:
+                continue
+            starts.setdefault(node._address, []).append(idx)
+            ends.setdefault(node._address + size, []).append(idx)
+        # Nodes covering the addresses from each start to the next, in the
+        # order of root.all_nodes(), so that each comes after its ancestors
+        self.starts = []
+        self.nodes = []
+        active = set()
+        for bound in sorted(set(starts) | set(ends)):
+            active.difference_update(ends.get(bound, ()))
+            active.update(starts.get(bound, ()))
+            covering = tuple(nodes[x] for x in sorted(active))
+            if self.nodes and self.nodes[-1] == covering:
+                continue
+            self.starts.append(bound)
+            self.nodes.append(covering)
+
+    def lookup_all(self, address):
+        """
+        :return: Tuple of the nodes which contain an address, in the order
+                 of ``root.all_nodes()``.
+        """
+        idx = bisect_right(self.starts, address) - 1
+        if idx < 0:
+            return ()
+        return self.nodes[idx]
+
+    def lookup(self, address):
+        """
+        :return: The innermost node which contains an address, or None.
+        """
+        covering = self.lookup_all(address)
+        if not covering:
+            return None
+        return covering[-1]
+
+    def lookup_many(self, addresses):
+        """
+        :return: List of the innermost node which contains each of the
+                 addresses, or None for those which no node contains.
+        """
+        return [self.lookup(x) for x in addresses]
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Incremental re-parsing of rebuilt map files.
+
+The linker map is split at the same output section headings used by
+:mod:`fpvgcc.parallel`, and each section is parsed on its own. A digest of
+the bytes of every section (and of the link alias table it starts with) is
+kept on the parser along with the nodes it contributed to the memory map.
+
+When the map file is parsed again with the previous parse as a reference,
+only sections whose digests are new are parsed. The nodes of sections which
+are gone are removed from the existing memory map and those of the new ones
+are spliced in their place. The rest of the map file (the dependencies,
+common symbols, memory configuration and whatever precedes the first output
+section) must be unchanged, and neither the sections removed nor those
+added may share top level nodes with other sections. Otherwise, the file is
+parsed in full.
+"""
+
+import hashlib
+
+from .compressed import compression_type
+from .fpv import GCCMemoryMapParserSM
+from .fpv import _process_map_file
+from .fpv import cleanup_and_pack_nodes
+from .fpv import process_map_line_b
+from .fpv import resolve_profile
+from .gccMemoryMap import LinkAliases
+from .parallel import _graft
+from .parallel import scan_section_boundaries
+
+
+# Size of the blocks in which sections are read to compute their digests
+_block_size = 2 ** 16
+
+_list_fields = ('idep_archives', 'idep_symbols', 'common_symbols',
+                'loaded_files', 'linker_defined_addresses')
+
+
+class SectionRecord(object):
+    def __init__(self, digest, csm):
+        self.digest = digest
+        # Alias items at the end of the section
+        self.aliases = csm.memory_map.aliases.items()
+        self.lists = dict((f, getattr(csm, f)) for f in _list_fields)
+        # Top level nodes of the memory map the section contributes to
+        self.nodes = list(csm.memory_map.top_level_nodes)
+        # Whether any of those nodes are shared with other sections
+        self.entangled = False
+
+
+class SectionDigests(object):
+    def __init__(self, digest):
+        # Digest of everything outside of the split linker map
+        self.digest = digest
+        self.prefix = None
+        self.suffix = None
+        self.head_nodes = []
+        self.tail_nodes = []
+        self.records = []
+
+
+def _base_ident(node):
+    return node.ident.split(':')[0]
+
+
+def _read_blocks(f, start, end):
+    # The bytes of the file from start to end, or to the end of the file if
+    # end is None, in blocks of at most _block_size
+    f.seek(start)
+    remaining = end - start if end is not None else None
+    while remaining is None or remaining > 0:
+        if remaining is None:
+            block = f.read(_block_size)
+        else:
+            block = f.read(min(_block_size, remaining))
+            remaining -= len(block)
+        if not block:
+            return
+        yield block
+
+
+def _read_lines(f, start, end):
+    # The lines of the file from start to end, or to the end of the file if
+    # end is None. Both are at the start of a line.
+    f.seek(start)
+    offset = start
+    while end is None or offset < end:
+        line = f.readline()
+        if not line:
+            return
+        offset += len(line)
+        yield line
+
+
+def _outer_digest(f, start, end):
+    h = hashlib.sha1()
+    for block in _read_blocks(f, 0, start):
+        h.update(block)
+    h.update(b'\0')
+    for block in _read_blocks(f, end, None):
+        h.update(block)
+    return h.hexdigest()
+
+
+def _sections(f, scan):
+    # (start, end, alias items, digest) for each output section
+    ends = [b[0] for b in scan.boundaries[1:]] + [scan.end]
+    for (start, aliases), end in zip(scan.boundaries, ends):
+        h = hashlib.sha1(repr(aliases).encode('utf-8'))
+        for block in _read_blocks(f, start, end):
+            h.update(block)
+        yield start, end, aliases, h.hexdigest()
+
+
+def _next_aliases(scan, idx):
+    if idx + 1 < len(scan.boundaries):
+        return scan.boundaries[idx + 1][1]
+    return scan.aliases
+
+
+def _parse_section(f, start, end, aliases, profile):
+    sm = GCCMemoryMapParserSM(ctx=profile)
+    sm.state = 'IN_LINKER_SCRIPT_AND_MEMMAP'
+    sm.memory_map.aliases.load(aliases)
+    for line in _read_lines(f, start, end):
+        process_map_line_b(line, sm)
+    return sm
+
+
+def _scan(fname):
+    if compression_type(fname) is not None:
+        return None
+    scan = scan_section_boundaries(fname)
+    if not scan.boundaries:
+        return None
+    return scan
+
+
+def _collect_lists(digests):
+    lists = dict((f, list(digests.prefix[f])) for f in _list_fields)
+    for record in digests.records:
+        for f in _list_fields:
+            lists[f].extend(record.lists[f])
+    for f in _list_fields:
+        lists[f].extend(digests.suffix[f])
+    return lists
+
+
+def _finish(sm, digests):
+    # Put the top level nodes back in file order, and bring everything
+    # derived from the section records up to date.
+    mm = sm.memory_map
+    order = []
+    seen = set()
+    for node in digests.head_nodes + \
+            [n for r in digests.records for n in r.nodes] + \
+            digests.tail_nodes:
+        if id(node) not in seen:
+            seen.add(id(node))
+            order.append(node)
+    mm.root._reset_children()
+    for node in order:
+        mm.root.add_child(node)
+    mm.resolve_regions()
+    for f, value in _collect_lists(digests).items():
+        setattr(sm, f, value)
+    mm.aliases = LinkAliases()
+    mm.aliases.load(digests.records[-1].aliases)
+    sm.section_digests = digests
+
+
+def _parse_full(fname, profile):
+    scan = _scan(fname)
+    if scan is None:
+        return None
+    with open(fname, 'rb') as f:
+        return _parse_full_file(f, scan, profile)
+
+
+def _parse_full_file(f, scan, profile):
+    sections = list(_sections(f, scan))
+    sm = GCCMemoryMapParserSM(ctx=profile)
+    root = sm.memory_map.root
+    for line in _read_lines(f, 0, sections[0][0]):
+        process_map_line_b(line, sm)
+    digests = SectionDigests(_outer_digest(f, sections[0][0], scan.end))
+    digests.prefix = dict((f, list(getattr(sm, f))) for f in _list_fields)
+    digests.head_nodes = list(root.children)
+    owners = dict((id(n), None) for n in root.children)
+
+    for idx, (start, end, aliases, digest) in enumerate(sections):
+        record = SectionRecord(
+            digest, _parse_section(f, start, end, aliases, profile)
+        )
+        if record.aliases != _next_aliases(scan, idx):
+            return None
+        nodes = []
+        for node in record.nodes:
+            base = _base_ident(node)
+            for existing in root.children:
+                if _base_ident(existing) == base:
+                    break
+            else:
+                existing = None
+            if not _graft(root, node):
+                return None
+            if existing is None:
+                owners[id(node)] = record
+                nodes.append(node)
+            else:
+                record.entangled = True
+                owner = owners[id(existing)]
+                if owner is not None:
+                    owner.entangled = True
+                nodes.append(existing)
+        record.nodes = nodes
+        digests.records.append(record)
+
+    for line in _read_lines(f, scan.end, None):
+        process_map_line_b(line, sm)
+    digests.suffix = dict((f, getattr(sm, f)[len(digests.prefix[f]):])
+                          for f in _list_fields)
+    digests.tail_nodes = [n for n in root.children if id(n) not in owners]
+    cleanup_and_pack_nodes(root.all_nodes())
+    _finish(sm, digests)
+    return sm
+
+
+def _parse_update(sm, fname):
+    scan = _scan(fname)
+    if scan is None:
+        return None
+    with open(fname, 'rb') as f:
+        return _parse_update_file(sm, f, scan)
+
+
+def _parse_update_file(sm, f, scan):
+    digests = sm.section_digests
+    sections = list(_sections(f, scan))
+    if _outer_digest(f, sections[0][0], scan.end) != digests.digest:
+        return None
+
+    available = {}
+    for record in digests.records:
+        available.setdefault(record.digest, []).append(record)
+    records = []
+    added = []
+    for idx, (start, end, aliases, digest) in enumerate(sections):
+        if available.get(digest):
+            record = available[digest].pop(0)
+        else:
+            record = SectionRecord(
+                digest, _parse_section(f, start, end, aliases, sm.ctx)
+            )
+            added.append(record)
+        if record.aliases != _next_aliases(scan, idx):
+            return None
+        records.append(record)
+    removed = [r for rs in available.values() for r in rs]
+    if any(r.entangled for r in removed):
+        return None
+
+    # Nodes of added sections must not collide with any which remain
+    root = sm.memory_map.root
+    gone = set(id(n) for r in removed for n in r.nodes)
+    idents = set(_base_ident(n) for n in root.children if id(n) not in gone)
+    for record in added:
+        for node in record.nodes:
+            if _base_ident(node) in idents:
+                return None
+            idents.add(_base_ident(node))
+
+    for record in removed:
+        for node in record.nodes:
+            root.remove_child(node)
+    for record in added:
+        for node in record.nodes:
+            _graft(root, node)
+    for record in added:
+        for node in record.nodes:
+            cleanup_and_pack_nodes(node.all_nodes())
+    digests.records = records
+    _finish(sm, digests)
+    return sm
+
+
+def process_map_file_incremental(fname, previous=None, profile=None):
+    """
+    Parse a map file, reusing a previous parse of an earlier version of it.
+
+    :param fname: Path to the map file.
+    :param previous: :class:`fpvgcc.fpv.GCCMemoryMapParserSM` returned by an
+                     earlier call to this function, or None.
+    :param profile: Toolchain profile, as for
+                    :func:`fpvgcc.fpv.process_map_file`. Defaults to the
+                    profile of the previous parse.
+    :return: The populated :class:`fpvgcc.fpv.GCCMemoryMapParserSM`. If the
+             previous parse could be updated in place, it is returned.
+    """
+    if previous is not None and profile is None:
+        profile = previous.ctx
+    profile = resolve_profile(fname, profile)
+    if previous is not None and type(previous.ctx) is type(profile) and \
+            previous.section_digests is not None:
+        sm = _parse_update(previous, fname)
+        if sm is not None:
+            return sm
+    sm = _parse_full(fname, profile)
+    if sm is None:
+        sm = _process_map_file(fname, profile)
+    return sm
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Lazy, per-section parsing of map files.
+
+:func:`process_map_file_lazy` runs the boundary scan from
+:mod:`fpvgcc.parallel` to find the file offsets of the output sections in
+the linker map, and parses everything before the first of them (which
+includes the Memory Configuration) right away. Each output section is
+parsed only when its subtree is first needed.
+
+Looking up a top level node of the memory map, as :meth:`get_node` and the
+per-section footprint queries do, parses just the sections which create
+it. Anything which needs the whole tree, such as ``root.all_nodes()`` or
+``top_level_nodes``, parses all the remaining sections first. The lists of
+loaded files and linker defined addresses are also only complete once all
+the sections have been parsed, and so do the same.
+"""
+
+import logging
+import os
+from collections import namedtuple
+
+from .compressed import compression_type
+from .compressed import open_map_file
+from .fpv import GCCMemoryMapParserSM
+from .fpv import _process_map_file
+from .fpv import cleanup_and_pack_nodes
+from .fpv import process_map_line_b
+from .fpv import resolve_profile
+from .gccMemoryMap import GCCMemoryMap
+from .gccMemoryMap import GCCMemoryMapNode
+from .parallel import _graft
+from .parallel import SectionBoundaries
+from .parallel import _parse_chunk
+from .parallel import scan_section_boundaries
+
+
+LazySection = namedtuple(
+    'LazySection', 'idx start end aliases next_aliases idents'
+)
+
+_list_fields = ('idep_archives', 'idep_symbols', 'common_symbols',
+                'loaded_files', 'linker_defined_addresses')
+
+
+class LazyRootNode(GCCMemoryMapNode):
+    @property
+    def children(self):
+        self.tree.load_all()
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value
+
+    def all_nodes(self):
+        self.tree.load_all()
+        return super(LazyRootNode, self).all_nodes()
+
+    def get_child_by_ident(self, ident):
+        self.tree.load_ident(ident)
+        return super(LazyRootNode, self).get_child_by_ident(ident)
+
+
+class LazyGCCMemoryMap(GCCMemoryMap):
+    def __init__(self, ctx, loader):
+        super(LazyGCCMemoryMap, self).__init__(ctx)
+        self.root = LazyRootNode(parent=self, node_t=self.node_t)
+        self.loader = loader
+        self.pending = []
+
+    def load_ident(self, ident):
+        # Parse the sections which create the top level node ident. If no
+        # section is known to create it, parse them all.
+        if not self.pending or self.loader.loading:
+            return
+        sections = [s for s in self.pending if ident in s.idents]
+        if not sections:
+            index = self.root._index
+            if index is not None and ident in index.by_ident:
+                return
+            sections = list(self.pending)
+        self.loader.load(sections)
+
+    def load_all(self):
+        if self.pending and not self.loader.loading:
+            self.loader.load(list(self.pending))
+
+
+def _lazy_list(field):
+    def fget(self):
+        mm = self.memory_map
+        mm.load_all()
+        if self.ready and not mm.pending and field not in self.assembled:
+            for idx in sorted(self.section_lists):
+                self.lists[field].extend(self.section_lists[idx][field])
+            self.assembled.add(field)
+        return self.lists[field]
+
+    def fset(self, value):
+        self.lists[field] = value
+
+    return property(fget, fset)
+
+
+class LazyGCCMemoryMapParserSM(GCCMemoryMapParserSM):
+    idep_archives = _lazy_list('idep_archives')
+    idep_symbols = _lazy_list('idep_symbols')
+    common_symbols = _lazy_list('common_symbols')
+    loaded_files = _lazy_list('loaded_files')
+    linker_defined_addresses = _lazy_list('linker_defined_addresses')
+
+    def __init__(self, ctx=None, fname=None):
+        self.lists = {}
+        self.ready = False
+        self.loading = False
+        self.assembled = set()
+        self.section_lists = {}
+        self.order = {}
+        self.fname = fname
+        super(LazyGCCMemoryMapParserSM, self).__init__(ctx)
+        self.memory_map = LazyGCCMemoryMap(self.ctx, self)
+
+    def load(self, sections):
+        """
+        Parse the given pending sections into the memory map.
+        """
+        mm = self.memory_map
+        root = mm.root
+        self.loading = True
+        try:
+            for section in sorted(sections):
+                mm.pending.remove(section)
+                csm = _parse_chunk(self.fname, section.start, section.end,
+                                   section.aliases, self.ctx)
+                if csm.memory_map.aliases.items() != section.next_aliases:
+                    self._load_sequential()
+                    return
+                touched = []
+                for node in list(csm.memory_map.top_level_nodes):
+                    if not _graft(root, node):
+                        self._load_sequential()
+                        return
+                    node = root.get_child_by_ident(node.ident)
+                    self.order[id(node)] = min(
+                        self.order.get(id(node), section.idx), section.idx
+                    )
+                    touched.append(node)
+                self.section_lists[section.idx] = dict(
+                    (f, getattr(csm, f)) for f in _list_fields
+                )
+                for node in touched:
+                    cleanup_and_pack_nodes(node.all_nodes())
+                    mm.resolve_regions(node)
+            # Keep the top level nodes in file order
+            root._children = sorted(root._children,
+                                    key=lambda x: self.order.get(id(x), -1))
+            mm.touch()
+        finally:
+            self.loading = False
+
+    def _load_sequential(self):
+        logging.warning("Output sections are not independent. "
+                        "Parsing the whole file.")
+        sm = _process_map_file(self.fname, self.ctx)
+        mm = self.memory_map
+        mm.pending = []
+        mm.aliases = sm.memory_map.aliases
+        mm.root._reset_children()
+        mm.touch()
+        for node in list(sm.memory_map.top_level_nodes):
+            _graft(mm.root, node)
+        mm.resolve_regions()
+        self.section_lists = {}
+        for f in _list_fields:
+            self.lists[f] = getattr(sm, f)
+            self.assembled.add(f)
+
+
+def process_map_file_lazy(fname, profile=None):
+    """
+    Parse a map file, deferring the parse of each output section in the
+    linker map until it is needed.
+
+    :param fname: Path to the map file.
+    :param profile: Toolchain profile, as for
+                    :func:`fpvgcc.fpv.process_map_file`.
+    :return: The :class:`LazyGCCMemoryMapParserSM`.
+    """
+    profile = resolve_profile(fname, profile)
+    if compression_type(fname) is None:
+        scan = scan_section_boundaries(fname)
+    else:
+        scan = SectionBoundaries()
+    sm = LazyGCCMemoryMapParserSM(ctx=profile, fname=fname)
+    if not scan.boundaries:
+        with open_map_file(fname, binary=True) as f:
+            for line in f:
+                process_map_line_b(line, sm)
+        cleanup_and_pack_nodes(sm.memory_map.root.all_nodes())
+        sm.ready = True
+        return sm
+
+    with open(fname, 'rb') as f:
+        data = f.read(scan.boundaries[0][0])
+    for line in data.splitlines(True):
+        process_map_line_b(line, sm)
+    cleanup_and_pack_nodes(sm.memory_map.root.all_nodes())
+
+    mm = sm.memory_map
+    ends = [b[0] for b in scan.boundaries[1:]] + [scan.end]
+    nexts = [b[1] for b in scan.boundaries[1:]] + [scan.aliases]
+    for idx, ((start, aliases), end, next_aliases) in \
+            enumerate(zip(scan.boundaries, ends, nexts)):
+        idents = frozenset(name.split('.')[1] for offset, name
+                           in scan.sections if start <= offset < end)
+        mm.pending.append(
+            LazySection(idx, start, end, aliases, next_aliases, idents)
+        )
+    # Whatever follows the linker map, parsed along with everything else
+    mm.pending.append(LazySection(len(ends), scan.end,
+                                  os.path.getsize(fname), scan.aliases,
+                                  scan.aliases, frozenset()))
+    mm.aliases.load(scan.aliases)
+    sm.ready = True
+    return sm
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parallel parsing of the linker script and memory map region.
+
+Output sections in the memory map are largely independent of each other.
+A quick first pass over the file (:func:`scan_section_boundaries`) records
+the byte offsets of the output section headings at which the parse can
+safely be split, along with the state of the link alias table at each
+of them. Contiguous runs of sections are then parsed in a process pool,
+each into its own :class:`fpvgcc.fpv.GCCMemoryMapParserSM`, and the
+resulting top level nodes are grafted into the main memory map in file
+order.
+
+Top level nodes which more than one chunk creates only as containers of
+dotted section names (``.ARM`` for ``.ARM.extab`` and ``.ARM.exidx``) are
+merged. If the partial parses otherwise turn out not to be independent
+(the same node produced by more than one chunk, or alias tables which
+differ from the first pass), the file is parsed sequentially instead.
+"""
+
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .compressed import compression_type
+from .fpv import GCCMemoryMapParserSM
+from .fpv import check_line_for_heading
+from .fpv import cleanup_and_pack_map
+from .fpv import decode_map_line
+from .fpv import linkaliases_list
+from .fpv import linkermap_line_key
+from .fpv import linkermap_name_normalize
+from .fpv import process_map_line_b
+from .fpv import re_linkermap
+from .gccMemoryMap import LinkAliases
+
+
+class SectionBoundaries(object):
+    def __init__(self):
+        # Byte offsets of the linker map region
+        self.start = None
+        self.end = None
+        # (offset, alias items) for each heading the parse can split at
+        self.boundaries = []
+        # Alias items at the end of the linker map region
+        self.aliases = []
+        # (offset, encoded name) of each output section heading
+        self.sections = []
+
+
+def scan_section_boundaries(fname):
+    """
+    Find the output section headings at which the linker map can be split.
+
+    This mirrors just enough of the LINKERMAP_STATE transitions to track
+    the current section and the link aliases registered within it. A
+    heading is not a safe split point if it would be consumed as the
+    detail line of a preceding name-only heading, or if a fill follows it
+    before any symbol does, since that fill belongs to the previous
+    section's last symbol.
+    """
+    result = SectionBoundaries()
+    aliases = LinkAliases()
+    section = None
+    got_section_name = False
+    candidate = None
+    state = None
+    offset = 0
+    with open(fname, 'rb') as f:
+        for line in f:
+            lstart = offset
+            offset += len(line)
+            if line.isspace():
+                continue
+            line = decode_map_line(line)
+            rval = check_line_for_heading(line)
+            if rval is not None:
+                if state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
+                    result.end = lstart
+                    break
+                state = rval
+                if state == 'IN_LINKER_SCRIPT_AND_MEMMAP':
+                    result.start = offset
+                continue
+            if state != 'IN_LINKER_SCRIPT_AND_MEMMAP':
+                continue
+            if got_section_name:
+                got_section_name = False
+                continue
+            key = linkermap_line_key(line)
+            if key == 'SECTION':
+                match = re_linkermap['SECTION_HEADINGS'].match(line)
+                if not match:
+                    continue
+                name = linkermap_name_normalize(match.group('name'))
+                if not name.startswith('.'):
+                    continue
+                if candidate is not None:
+                    result.boundaries.append(candidate)
+                candidate = (lstart, aliases.items())
+                section = aliases.encode(name)
+                result.sections.append((lstart, section))
+                if match.group('address') is None:
+                    got_section_name = True
+            elif key == 'ALIASES' and section is not None:
+                match = re_linkermap['LINKALIASES'].match(line)
+                if not match:
+                    continue
+                for alias in linkaliases_list(match):
+                    if alias != section:
+                        aliases.load([(alias, section)])
+            elif key == 'FILL':
+                candidate = None
+            elif key in ('SYMBOL', 'SYMBOLONLY') and candidate is not None:
+                match = re_linkermap[key].match(line)
+                if not match:
+                    continue
+                name = linkermap_name_normalize(match.group('name'))
+                if name.startswith('.'):
+                    result.boundaries.append(candidate)
+                    candidate = None
+    if candidate is not None:
+        result.boundaries.append(candidate)
+    if result.start is not None and result.end is None:
+        result.end = offset
+    result.aliases = aliases.items()
+    return result
+
+
+# Files smaller than this are parsed sequentially. Starting the workers and
+# returning the partial trees from them costs more than the parse itself.
+parallel_min_size = 16 * 2 ** 20
+
+
+def _plan_chunks(scan, nchunks):
+    # Group the boundaries into at most nchunks contiguous byte ranges of
+    # roughly equal size. Each chunk is (start, end, alias items).
+    if not scan.boundaries:
+        return []
+    target = (scan.end - scan.boundaries[0][0]) // nchunks
+    chunks = []
+    for offset, aliases in scan.boundaries:
+        if chunks and offset - chunks[-1][0] < target:
+            continue
+        if chunks:
+            chunks[-1][1] = offset
+        chunks.append([offset, None, aliases])
+    chunks[-1][1] = scan.end
+    return [tuple(x) for x in chunks]
+
+
+def _parse_chunk(fname, start, end, aliases, profile):
+    sm = GCCMemoryMapParserSM(ctx=profile)
+    sm.state = 'IN_LINKER_SCRIPT_AND_MEMMAP'
+    sm.memory_map.aliases.load(aliases)
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for line in io.BytesIO(data):
+        process_map_line_b(line, sm)
+    return sm
+
+
+def _parse_range(fname, sm, start, end):
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start) if end is not None else f.read()
+    for line in io.BytesIO(data):
+        process_map_line_b(line, sm)
+
+
+_node_properties = ('_address', '_defsize', '_size', '_fillsize',
+                    'objfile', 'arfile', 'arfolder')
+
+
+def _is_bare_node(node):
+    # An intermediate node created only to hold descendents
+    return node._address is None and node._defsize is None and \
+        node._size is None and not node.fillsize and \
+        node.objfile is None and node.arfile is None and \
+        node.arfolder is None
+
+
+def _graft(parent, node):
+    # Attach a node parsed in a chunk under the equivalent parent in the
+    # main tree. Nodes which the chunk and the main tree both have are only
+    # acceptable if at least one of them is a bare intermediate node, as
+    # when an output section heading follows those of its dotted children.
+    # The children are then grafted in turn.
+    base = node.ident.split(':')[0]
+    for existing in parent.children:
+        if existing.ident.split(':')[0] == base:
+            break
+    else:
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            # Region codes are specific to the memory map of the chunk
+            n._region = None
+            stack.extend(n.children)
+        parent.add_child(node)
+        return True
+    if existing.ident != node.ident:
+        return False
+    if not _is_bare_node(node):
+        if not _is_bare_node(existing):
+            return False
+        for attr in _node_properties:
+            setattr(existing, attr, getattr(node, attr))
+        existing.invalidate_size()
+    for child in list(node.children):
+        if not _graft(existing, child):
+            return False
+    return True
+
+
+def _merge_chunk(sm, csm, aliases):
+    if csm.memory_map.aliases.items() != aliases:
+        return False
+    for node in list(csm.memory_map.top_level_nodes):
+        if not _graft(sm.memory_map.root, node):
+            return False
+    for attr in ('idep_archives', 'idep_symbols', 'common_symbols',
+                 'loaded_files', 'linker_defined_addresses'):
+        getattr(sm, attr).extend(getattr(csm, attr))
+    sm.memory_map.aliases = csm.memory_map.aliases
+    sm.LINKERMAP_STATE = csm.LINKERMAP_STATE
+    sm.linkermap_section = csm.linkermap_section
+    sm.linkermap_symbol = csm.linkermap_symbol
+    sm.linkermap_lastsymbol = csm.linkermap_lastsymbol
+    return True
+
+
+def process_map_file_parallel(fname, profile, jobs):
+    """
+    Parse a map file, splitting the linker map across ``jobs`` processes.
+
+    The parse is only done in parallel where it is possible and likely to
+    pay off. Otherwise, None is returned, and the caller is expected to
+    parse the file sequentially instead. This is the case for compressed
+    files, for files smaller than ``parallel_min_size``, if fewer than two
+    processes are left after limiting ``jobs`` to the number of CPUs, if
+    the linker map cannot be split into at least two chunks, and if the
+    chunks turn out not to be independent once parsed.
+
+    :param fname: Path to the map file.
+    :param profile: Resolved toolchain profile (context) instance.
+    :param jobs: Number of worker processes to use.
+    :return: The populated :class:`fpvgcc.fpv.GCCMemoryMapParserSM`, or
+             None if the file should be parsed sequentially.
+    """
+    jobs = min(jobs, os.cpu_count() or 1)
+    if jobs < 2:
+        return None
+    if compression_type(fname) is not None:
+        return None
+    if os.path.getsize(fname) < parallel_min_size:
+        return None
+    scan = scan_section_boundaries(fname)
+    chunks = _plan_chunks(scan, jobs)
+    if len(chunks) < 2:
+        return None
+
+    sm = GCCMemoryMapParserSM(ctx=profile)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_parse_chunk, fname, start, end,
+                                   aliases, profile)
+                   for start, end, aliases in chunks]
+        _parse_range(fname, sm, 0, chunks[0][0])
+        for idx, future in enumerate(futures):
+            if idx + 1 < len(chunks):
+                aliases = chunks[idx + 1][2]
+            else:
+                aliases = scan.aliases
+            if not _merge_chunk(sm, future.result(), aliases):
+                logging.warning("Output sections are not independent. "
+                                "Falling back to sequential parse.")
+                for f in futures:
+                    f.cancel()
+                return None
+    _parse_range(fname, sm, scan.end, None)
+    cleanup_and_pack_map(sm)
+    return sm
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# This file is part of fpv-gcc.
+#
+# fpv-gcc is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# fpv-gcc is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with fpv-gcc.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Footprint pivot tables of a parsed memory map.
+
+:class:`FootprintPivots` holds the total leaf size of the nodes of a
+:class:`fpvgcc.gccMemoryMap.GCCMemoryMap` grouped by object file, archive
+file and symbol against their regions, and by object file and archive file
+against the sections ``used_sections`` can list, which are the top level
+nodes and the children of those which are not in any region. All of them
+are built together in a single pass over the nodes, so that the footprint
+reports need not scan the map once for every cell. Footprints in any other
+section are left to the per section queries of the memory map.
+
+Files are keyed by their ids in the string table of the memory map,
+symbols by their names, regions by their names and sections by their
+gidents.
+"""
+
+
+class FootprintPivots(object):
+    def __init__(self, mm):
+        self.memory_map = mm
+        nodes = mm.root.all_nodes()
+        # Taken after the traversal, which loads lazily parsed maps
+        self.generation = mm.generation
+        # Whether the regions of all the nodes could be resolved. The
+        # region pivots are only usable if they could.
+        self.complete = True
+        # key -> {region: total leaf size}
+        self.objfile_regions = {}
+        self.arfile_regions = {}
+        self.symbol_regions = {}
+        # key -> {section: total leaf size}
+        self.objfile_sections = {}
+        self.arfile_sections = {}
+        # Gidents of the sections the pivots have footprints in
+        self.sections = set()
+        self._build(nodes)
+
+    def _add(self, node, sections):
+        size = node.leafsize
+        if not size:
+            return
+        try:
+            region = node.region
+        except ValueError:
+            self.complete = False
+        else:
+            for pivot, key in ((self.objfile_regions, node._objfile),
+                               (self.arfile_regions, node._arfile),
+                               (self.symbol_regions, node.name)):
+                sums = pivot.setdefault(key, {})
+                sums[region] = sums.get(region, 0) + size
+        for pivot, key in ((self.objfile_sections, node._objfile),
+                           (self.arfile_sections, node._arfile)):
+            sums = pivot.setdefault(key, {})
+            for section in sections:
+                sums[section] = sums.get(section, 0) + size
+
+    def _add_subtree(self, node, sections):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            self._add(node, sections)
+            stack.extend(node.children)
+
+    def _build(self, nodes):
+        # Sections are top level nodes, and the children of those top level
+        # nodes which are not in any region, as in used_sections
+        root = nodes[0]
+        self._add(root, ())
+        for top in root.children:
+            try:
+                undefined = top.region == 'UNDEF'
+            except ValueError:
+                undefined = False
+            self.sections.add(top.gident)
+            if not undefined:
+                self._add_subtree(top, (top.gident,))
+                continue
+            self._add(top, (top.gident,))
+            for child in top.children:
+                self.sections.add(child.gident)
+                self._add_subtree(child, (top.gident, child.gident))
+
+    def _region_row(self, pivot, key, regions):
+        mm = self.memory_map
+        sums = pivot.get(key, {})
+        row = []
+        for region in regions:
+            if mm.collapse_vectors and region == 'VEC':
+                row.append(sum(v for k, v in sums.items() if 'VEC' in k))
+            else:
+                row.append(sums.get(region, 0))
+        return row
+
+    def has_section(self, section):
+        """
+        :return: Whether footprints in a section are in the pivots.
+        """
+        if section == '.*vec*':
+            return all(x in self.sections
+                       for x in self.memory_map._vector_sections)
+        return section in self.sections
+
+    def _section_row(self, pivot, key, sections, fallback):
+        sums = pivot.get(key, {})
+        row = []
+        for section in sections:
+            if not self.has_section(section):
+                row.append(fallback(section))
+            elif section == '.*vec*':
+                row.append(sum(sums.get(x, 0)
+                               for x in self.memory_map._vector_sections))
+            else:
+                row.append(sums.get(section, 0))
+        return row
+
+    def _file_key(self, name):
+        return self.memory_map.strings.id(name)
+
+    def objfile_fp(self, objfile, regions):
+        """
+        :return: List of the footprint of an object file in each region.
+        """
+        return self._region_row(self.objfile_regions,
+                                self._file_key(objfile), regions)
+
+    def arfile_fp(self, arfile, regions):
+        """
+        :return: List of the footprint of an archive file in each region.
+        """
+        return self._region_row(self.arfile_regions,
+                                self._file_key(arfile), regions)
+
+    def symbol_fp(self, symbol, regions):
+        """
+        :return: List of the footprint of a symbol in each region.
+        """
+        return self._region_row(self.symbol_regions, symbol, regions)
+
+    def objfile_fp_secs(self, objfile, sections):
+        """
+        :return: List of the footprint of an object file in each section.
+        """
+        return self._section_row(
+            self.objfile_sections, self._file_key(objfile), sections,
+            lambda x: self.memory_map.get_objfile_fp_sec(objfile, x)
+        )
+
+    def arfile_fp_secs(self, arfile, sections):
+        """
+        :return: List of the footprint of an archive file in each section.
+        """
+        return self._section_row(
+            self.arfile_sections, self._file_key(arfile), sections,
+            lambda x: self.memory_map.get_arfile_fp_sec(arfile, x)
+        )
@@ -1,15 +1,26 @@
+import os
+import re
 
+from ..compressed import compression_type
+from ..compressed import open_map_file
 
-import re
+
+def _last_line(fp):
+    line = b''
+    for candidate in fp:
+        if candidate.strip():
+            line = candidate
+    return line
 
 
 def guess_profile(fpath):
-    fp = open(fpath, "rb")
-    fp.seek(-300 - 1, 2)
+    with open_map_file(fpath, binary=True) as fp:
+        if compression_type(fpath) is None:
+            # Only the tail of an uncompressed file needs to be read
+            fp.seek(max(os.path.getsize(fpath) - 300 - 1, 0))
+        line = _last_line(fp).strip().decode()
 
     rex = r"^OUTPUT\((?P<file>[\S]+)\s(?P<sig>[\S]+)\)$"
-    line = fp.readlines()[-1].strip().decode()
-
     matches = re.search(rex, line)
     if matches:
         return matches.group('sig')
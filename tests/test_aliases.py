@@ -0,0 +1,32 @@
+
+
+from fpvgcc.gccMemoryMap import LinkAliases
+
+
+def test_alias_longest_prefix():
+    aliases = LinkAliases()
+    aliases.register_alias('.text_out', '.text.mod')
+    aliases.register_alias('.text_mod1_out', '.text.mod1')
+    assert aliases.encode('.text.mod1_init') == '.text_mod1_out.text.mod1_init'
+    assert aliases.encode('.text.mod2_init') == '.text_out.text.mod2_init'
+    assert aliases.encode('.text.mo') == '.text.mo'
+    assert aliases.encode('.data.mod1') == '.data.mod1'
+
+
+def test_alias_load():
+    aliases = LinkAliases()
+    aliases.register_alias('.bss', 'COMMON')
+    restored = LinkAliases()
+    restored.load(aliases.items())
+    restored.load([('COMMON', '.data')])
+    assert restored.items() == aliases.items()
+    assert restored.encode('COMMON') == '.bssCOMMON'
+
+
+def test_alias_empty_prefix():
+    aliases = LinkAliases()
+    aliases.register_alias('.all', '')
+    assert aliases.encode('.data.mod1') == '.all.data.mod1'
+    aliases.register_alias('.text_out', '.text.mod')
+    assert aliases.encode('.text.mod1') == '.text_out.text.mod1'
+    assert aliases.encode('.text.mo') == '.all.text.mo'
@@ -0,0 +1,48 @@
+
+
+import os
+import subprocess
+import sys
+
+from fpvgcc.batch import analyze_maps
+from fpvgcc.batch import expand_mapfiles
+from .vectors import EXAMPLE_FILES
+
+
+def test_expand_mapfiles():
+    mapfiles = expand_mapfiles(['tests/maps/*.map',
+                                'tests/maps/example.msp430-elf.0.map'])
+    assert sorted(mapfiles) == sorted(EXAMPLE_FILES.keys())
+
+
+def test_analyze_maps():
+    reports = list(analyze_maps(['tests/maps/*.map'], jobs=2))
+    assert [r.mapfile for r in reports] == \
+        expand_mapfiles(['tests/maps/*.map'])
+    for report in reports:
+        assert len(report.totals) == len(report.regions)
+        assert 'TOTALS' in report.report
+
+
+def test_batch_worker_logging():
+    # Spawned workers do not inherit the logging configuration of the
+    # parent, and must set it up from the verbosity themselves.
+    script = ("import multiprocessing, sys\n"
+              "from fpvgcc.batch import main\n"
+              "if __name__ == '__main__':\n"
+              "    multiprocessing.set_start_method('spawn')\n"
+              "    main(sys.argv[1:])\n")
+    mapfile = 'tests/maps/example.arm-none-eabi.basic.0.map'
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.abspath('src')] +
+        [x for x in [env.get('PYTHONPATH')] if x]
+    )
+    for verbose, expected in (([], False), (['-v'], True)):
+        result = subprocess.run(
+            [sys.executable, '-c', script] + verbose + ['-j', '1', mapfile],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+            universal_newlines=True
+        )
+        assert result.returncode == 0
+        assert ('Unhandled line in section' in result.stderr) == expected
@@ -0,0 +1,94 @@
+
+
+import os
+import pickle
+import zlib
+
+import pytest
+
+from fpvgcc import cache
+from fpvgcc.cache import CACHE_SUFFIX
+from fpvgcc.fpv import process_map_file
+from .vectors import EXAMPLE_FILES
+from .vectors import dump_map
+
+
+def _entries(cache_dir):
+    return [x for x in os.listdir(str(cache_dir)) if x.endswith(CACHE_SUFFIX)]
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_cache_roundtrip(filename, tmp_path):
+    sm = process_map_file(filename)
+    smc = process_map_file(filename, cache_dir=str(tmp_path))
+    assert len(_entries(tmp_path)) == 1
+    smc = process_map_file(filename, cache_dir=str(tmp_path))
+    assert smc.loaded_files == sm.loaded_files
+    assert smc.memory_map.aliases.items() == sm.memory_map.aliases.items()
+    assert [r.name for r in smc.memory_map.memory_regions] == \
+        [r.name for r in sm.memory_map.memory_regions]
+    assert smc.memory_map.used_regions == sm.memory_map.used_regions
+    assert dump_map(smc) == dump_map(sm)
+    assert [repr(x) for x in smc.common_symbols] == \
+        [repr(x) for x in sm.common_symbols]
+    assert [repr(x) for x in smc.linker_defined_addresses] == \
+        [repr(x) for x in sm.linker_defined_addresses]
+    assert [repr(x) for x in smc.idep_archives] == \
+        [repr(x) for x in sm.idep_archives]
+    assert list(smc.discarded) == list(sm.discarded)
+    assert smc.dependencies.included_by == sm.dependencies.included_by
+    assert smc.dependencies.pulled_in == sm.dependencies.pulled_in
+
+
+def test_cache_corrupt_entry(tmp_path):
+    filename = list(EXAMPLE_FILES.keys())[0]
+    sm = process_map_file(filename, cache_dir=str(tmp_path))
+    entry = os.path.join(str(tmp_path), _entries(tmp_path)[0])
+    with open(entry, 'wb') as f:
+        f.write(b'garbage')
+    smc = process_map_file(filename, cache_dir=str(tmp_path))
+    assert dump_map(smc) == dump_map(sm)
+    assert len(_entries(tmp_path)) == 1
+
+
+def test_cache_entry_not_unpickled(tmp_path):
+    filename = list(EXAMPLE_FILES.keys())[0]
+    sm = process_map_file(filename, cache_dir=str(tmp_path))
+    entry = os.path.join(str(tmp_path), _entries(tmp_path)[0])
+    marker = tmp_path / 'marker'
+    payload = pickle.dumps(_Payload(str(marker)))
+    with open(entry, 'wb') as f:
+        f.write(zlib.compress(payload))
+    smc = process_map_file(filename, cache_dir=str(tmp_path))
+    assert not marker.exists()
+    assert dump_map(smc) == dump_map(sm)
+
+
+class _Payload(object):
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return open, (self.path, 'w')
+
+
+def test_cache_unwritable(tmp_path, monkeypatch):
+    filename = list(EXAMPLE_FILES.keys())[0]
+    sm = process_map_file(filename)
+
+    def fail(*args):
+        raise OSError("read-only")
+    monkeypatch.setattr(cache, '_write_atomic', fail)
+    smc = process_map_file(filename, cache_dir=str(tmp_path))
+    assert dump_map(smc) == dump_map(sm)
+    assert _entries(tmp_path) == []
+
+
+def test_cache_index_pruned(tmp_path):
+    filenames = list(EXAMPLE_FILES.keys())[:2]
+    for filename in filenames:
+        process_map_file(filename, cache_dir=str(tmp_path))
+    mc = cache.MapCache(str(tmp_path), max_size=0)
+    mc.evict()
+    assert _entries(tmp_path) == []
+    assert mc._read_index() == {}
@@ -0,0 +1,54 @@
+
+
+import pytest
+
+from fpvgcc import columnar
+from fpvgcc.fpv import process_map_file
+from .vectors import EXAMPLE_FILES
+
+
+def _footprints(mm):
+    rval = []
+    for objfile in mm.used_objfiles:
+        rval.append(mm.get_objfile_fp(objfile))
+        rval.append(mm.get_objfile_fp_secs(objfile))
+    for arfile in mm.used_arfiles:
+        rval.append(mm.get_arfile_fp(arfile))
+        rval.append(mm.get_arfile_fp_secs(arfile))
+    for symbol in mm.all_symbols:
+        rval.append(mm.get_symbol_fp(symbol))
+    return rval
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_columnar_footprints(filename, use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(columnar, 'numpy', None)
+    elif columnar.numpy is None:
+        pytest.skip("NumPy is not installed")
+    mm = process_map_file(filename).memory_map
+    expected = _footprints(mm)
+    mm.columnar = True
+    assert mm.columns is not None
+    assert _footprints(mm) == expected
+
+
+def test_columnar_rows():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map').memory_map
+    strings = list(mm.strings.strings)
+    mm.columnar = True
+    columns = mm.columns
+    assert mm.strings.strings == strings
+    nodes = mm.root.all_nodes()
+    assert len(columns) == len(nodes)
+    node = mm.get_node('.text')
+    start, end = columns.row_range(node)
+    assert columns.nodes[start:end] == node.all_nodes()
+    assert columns.parent[start + 1] == start
+    for row, n in enumerate(nodes):
+        assert columns.end[row] == row + len(n.all_nodes())
+    assert mm.columns is columns
+    mm.get_node('.text.extra', create=True)
+    assert mm.columns is not columns
+
@@ -0,0 +1,53 @@
+
+
+import bz2
+import gzip
+import lzma
+import os
+
+import pytest
+
+from fpvgcc.compressed import compression_type
+from fpvgcc.events import iter_map_events
+from fpvgcc.fpv import process_map_file
+from fpvgcc.lazy import process_map_file_lazy
+from fpvgcc.profiles.guess import guess_profile
+from .vectors import EXAMPLE_FILES
+from .vectors import dump_map
+
+
+COMPRESSORS = {
+    'gzip': (gzip.open, '.gz'),
+    'bz2': (bz2.open, '.bz2'),
+    'xz': (lzma.open, '.xz'),
+}
+
+
+@pytest.fixture(params=sorted(COMPRESSORS.keys()))
+def compressed_map(request, tmp_path):
+    filename = list(EXAMPLE_FILES.keys())[1]
+    opener, suffix = COMPRESSORS[request.param]
+    path = os.path.join(str(tmp_path), os.path.basename(filename) + suffix)
+    with open(filename, 'rb') as src, opener(path, 'wb') as dst:
+        dst.write(src.read())
+    return filename, path, request.param
+
+
+def test_compression_type(compressed_map):
+    filename, path, ctype = compressed_map
+    assert compression_type(path) == ctype
+    assert compression_type(filename) is None
+
+
+def test_compressed_guess_profile(compressed_map):
+    filename, path, ctype = compressed_map
+    assert guess_profile(path) == guess_profile(filename)
+
+
+def test_compressed_process_map(compressed_map):
+    filename, path, ctype = compressed_map
+    sm = process_map_file(filename)
+    for kwargs in ({}, {'use_mmap': True}, {'jobs': 2}):
+        assert dump_map(process_map_file(path, **kwargs)) == dump_map(sm)
+    assert dump_map(process_map_file_lazy(path)) == dump_map(sm)
+    assert list(iter_map_events(path)) == list(iter_map_events(filename))
@@ -0,0 +1,81 @@
+
+
+import json
+
+from fpvgcc.dependencies import ArchiveDependencyGraph
+from fpvgcc.fpv import GCCMemoryMapParserSM
+from fpvgcc.fpv import process_dependencies_line
+from fpvgcc.fpv import process_map_file
+from fpvgcc.profiles import get_profile
+
+
+MAPFILE = 'tests/maps/example.msp430-elf.0.map'
+
+
+def test_dependency_graph():
+    sm = process_map_file(MAPFILE)
+    graph = sm.dependencies
+    assert len(graph) == len(sm.idep_archives)
+    malloc = graph.resolve('libc.a(lib_a-malloc.o)')
+    assert malloc.endswith('/msp430-elf/lib/libc.a(lib_a-malloc.o)')
+    assert [(referrer, symbol) for _, referrer, symbol
+            in graph.why(malloc)] == [
+        ('../uc-impl/libhal-uc-entropy-msp430f5529.a(entropy_impl.c.obj)',
+         'malloc'),
+        ('librandom-test-msp430f5529.a(test_random.c.obj)', 'entropy_init'),
+        ('CMakeFiles/firmware-msp430f5529.elf.dir/main.c.obj',
+         'random_test_init'),
+    ]
+    direct = [m for m, _ in graph.pulls_in(malloc)]
+    pulled = [m for _, m, _ in graph.pulls_in_all(malloc)]
+    assert set(direct) < set(pulled)
+    assert malloc not in pulled
+    assert graph.resolve('nonexistent.a(none.o)') is None
+
+
+def test_dependency_graph_short_member():
+    sm = GCCMemoryMapParserSM(ctx=get_profile('default'))
+    for line in ['libc.a(printf.o)              main.o (printf)\n',
+                 '/a/very/long/path/to/libc.a(vfprintf.o)\n',
+                 '                              libc.a(printf.o) '
+                 '(_vfprintf_r)\n']:
+        process_dependencies_line(line, sm)
+    graph = sm.dependencies
+    assert graph.why('vfprintf.o') == []
+    assert graph.why('libc.a(vfprintf.o)') == [
+        ('/a/very/long/path/to/libc.a(vfprintf.o)', 'libc.a(printf.o)',
+         '_vfprintf_r'),
+        ('libc.a(printf.o)', 'main.o', 'printf'),
+    ]
+    assert graph.pulls_in_all('main.o') == [
+        (1, 'libc.a(printf.o)', 'printf'),
+        (2, '/a/very/long/path/to/libc.a(vfprintf.o)', '_vfprintf_r'),
+    ]
+
+
+def test_dependency_graph_dump_load():
+    graph = process_map_file(MAPFILE).dependencies
+    loaded = ArchiveDependencyGraph()
+    loaded.load(json.loads(json.dumps(graph.dump())))
+    assert loaded.included_by == graph.included_by
+    assert loaded.pulled_in == graph.pulled_in
+    assert loaded.members == graph.members
+    malloc = loaded.resolve('libc.a(lib_a-malloc.o)')
+    assert malloc == graph.resolve('libc.a(lib_a-malloc.o)')
+    assert loaded.why(malloc) == graph.why(malloc)
+
+
+def test_dependency_graph_spaced_paths():
+    sm = GCCMemoryMapParserSM(ctx=get_profile('default'))
+    for line in ['/opt/my libs/libc.a(printf.o)\n',
+                 '                              /src/my app/main.o '
+                 '(printf)\n',
+                 '/opt/my libs/libc.a(vfprintf.o)  '
+                 '/opt/my libs/libc.a(printf.o) (_vfprintf_r)\n']:
+        process_dependencies_line(line, sm)
+    graph = sm.dependencies
+    assert graph.why('libc.a(vfprintf.o)') == [
+        ('/opt/my libs/libc.a(vfprintf.o)', '/opt/my libs/libc.a(printf.o)',
+         '_vfprintf_r'),
+        ('/opt/my libs/libc.a(printf.o)', '/src/my app/main.o', 'printf'),
+    ]
@@ -0,0 +1,37 @@
+
+
+import pytest
+
+from fpvgcc.fpv import process_map_file
+from .vectors import EXAMPLE_FILES
+
+
+DISCARDED_COUNTS = {
+    'tests/maps/example.arm-none-eabi.basic.0.map': 282,
+    'tests/maps/example.msp430-elf.0.map': 697,
+    'tests/maps/example.msp430-elf.basic.0.map': 523,
+}
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_discarded_sections(filename):
+    sm = process_map_file(filename)
+    discarded = sm.discarded
+    assert len(discarded) == DISCARDED_COUNTS[filename]
+    assert list(process_map_file(filename, use_mmap=True).discarded) == \
+        list(discarded)
+    assert sum(discarded.get_objfile_size(x)
+               for x in discarded.used_objfiles) == discarded.total_size
+
+
+def test_discarded_symbol():
+    sm = process_map_file('tests/maps/example.msp430-elf.0.map')
+    discarded = sm.discarded
+    assert discarded.is_discarded('watchdog_init')
+    assert not discarded.is_discarded('main')
+    section = discarded.symbol_sections('watchdog_init')[0]
+    assert section.name == '.text.watchdog_init'
+    assert section.size == 0xe
+    assert section.objfile == 'core_impl.c.obj'
+    assert section.arfile == 'libhal-uc-core-msp430f5529.a'
+    assert section in discarded.objfile_sections('core_impl.c.obj')
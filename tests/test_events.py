@@ -0,0 +1,37 @@
+
+
+import pytest
+
+from fpvgcc.events import iter_map_events
+from fpvgcc.events import CommonSymbolEvent
+from fpvgcc.events import FillEvent
+from fpvgcc.events import LoadEvent
+from fpvgcc.events import MemoryRegionEvent
+from fpvgcc.events import SymbolEvent
+from fpvgcc.fpv import process_map_file
+from .vectors import EXAMPLE_FILES
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_map_events(filename):
+    sm = process_map_file(filename)
+    events = list(iter_map_events(filename))
+    assert [e.path for e in events if isinstance(e, LoadEvent)] == \
+        sm.loaded_files
+    assert [e.name for e in events if isinstance(e, MemoryRegionEvent)] == \
+        [r.name for r in sm.memory_map.memory_regions]
+    assert len([e for e in events if isinstance(e, CommonSymbolEvent)]) == \
+        len(sm.common_symbols)
+    assert sum(e.size for e in events
+               if isinstance(e, (SymbolEvent, FillEvent))) == \
+        sum(n.leafsize or 0 for n in sm.memory_map.root.all_nodes())
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_map_events_fileobj(filename):
+    with open(filename) as f:
+        events = iter_map_events(f)
+        first = next(e for e in events if isinstance(e, SymbolEvent))
+        events.close()
+        assert not f.closed
+    assert first.size is not None
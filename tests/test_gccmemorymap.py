@@ -0,0 +1,60 @@
+
+
+import pytest
+
+from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.gccMemoryMap import MemoryRegion
+from fpvgcc.profiles import get_profile
+
+
+def test_region_index():
+    mm = GCCMemoryMap(get_profile('default'))
+    mm.memory_regions.append(MemoryRegion('FLASH', '0x1000', '0x1000', 'xr'))
+    mm.memory_regions.append(MemoryRegion('RAM', '0x4000', '0x1000', 'rw'))
+    mm.memory_regions.append(
+        MemoryRegion('*default*', '0x0', '0xffffffff', '')
+    )
+    index = mm.region_index
+    assert mm.region_names[index.lookup(0x1800)] == 'FLASH'
+    assert mm.region_names[index.lookup(0x4fff)] == 'RAM'
+    assert mm.region_names[index.lookup(0x3000)] == 'DISCARDED'
+    assert index.lookup(0x100000000) is None
+
+    mm.get_node('.text', create=True).address = '0x1000'
+    mm.get_node('.text.main_o', create=True).address = '0x1010'
+    mm.get_node('.vectors', create=True).address = '0x200000000'
+    mm.get_node('.vectors.reset_o', create=True).address = '0x1000'
+    mm.resolve_regions()
+    assert mm.get_node('.text.main_o')._region is not None
+    assert mm.get_node('.vectors.reset_o')._region is None
+    assert mm.get_node('.text.main_o').region == 'FLASH'
+    with pytest.raises(ValueError):
+        mm.get_node('.vectors.reset_o').region
+
+    mm.memory_regions.append(MemoryRegion('HIGH', '0x200000000', '0x10', ''))
+    assert mm.region_index is not index
+    assert mm.get_node('.vectors.reset_o').region == 'FLASH'
+
+
+def test_address_index():
+    mm = GCCMemoryMap(get_profile('default'))
+    mm.memory_regions.append(MemoryRegion('FLASH', '0x1000', '0x1000', 'xr'))
+    text = mm.get_node('.text', create=True)
+    text.address = '0x1000'
+    for name, address, size in (('a', '0x1000', '0x10'),
+                                ('b', '0x1010', '0x8'),
+                                ('c', '0x1020', '0x0')):
+        node = mm.get_node('.text.' + name, create=True)
+        node.address = address
+        node.osize = size
+    a, b = mm.get_node('.text.a'), mm.get_node('.text.b')
+    index = mm.address_index
+    assert index.lookup_all(0x1004) == (text, a)
+    assert index.lookup(0x1017) is b
+    assert index.lookup_many([0x1014, 0x100f, 0xfff]) == [b, a, None]
+    assert [n for n in mm.root.all_nodes() if n.contains_address('0x1010')] \
+        == list(index.lookup_all(0x1010))
+
+    b.osize = '0x20'
+    assert mm.address_index is not index
+    assert mm.address_index.lookup(0x1020) is b
@@ -0,0 +1,56 @@
+
+
+import shutil
+
+import pytest
+
+from fpvgcc import incremental
+from fpvgcc.fpv import process_map_file
+from fpvgcc.incremental import process_map_file_incremental
+from .vectors import dump_map
+
+
+MAPS = ['tests/maps/example.arm-none-eabi.basic.0.map',
+        'tests/maps/example.msp430-elf.0.map']
+
+
+def _rebuild(path):
+    # Shrink the first .text input section in the linker map
+    with open(path) as f:
+        content = f.read()
+    idx = content.index('Linker script and memory map')
+    idx = content.index('       0x74 ', idx)
+    content = content[:idx] + '       0x70 ' + content[idx + 12:]
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+@pytest.mark.parametrize('filename', MAPS)
+def test_incremental_full(filename):
+    sm = process_map_file(filename)
+    smi = process_map_file_incremental(filename)
+    assert smi.section_digests is not None
+    assert smi.loaded_files == sm.loaded_files
+    assert [repr(x) for x in smi.linker_defined_addresses] == \
+        [repr(x) for x in sm.linker_defined_addresses]
+    assert smi.memory_map.aliases.items() == sm.memory_map.aliases.items()
+    assert dump_map(smi) == dump_map(sm)
+
+
+@pytest.mark.parametrize('filename', MAPS)
+def test_incremental_update(filename, tmp_path, monkeypatch):
+    # Read the sections in many blocks each
+    monkeypatch.setattr(incremental, '_block_size', 61)
+    path = str(tmp_path / 'rebuilt.map')
+    shutil.copy(filename, path)
+    smi = process_map_file_incremental(path)
+    _rebuild(path)
+    smu = process_map_file_incremental(path, previous=smi)
+    assert smu is smi
+    sm = process_map_file(path)
+    assert sm.memory_map.used_regions == smu.memory_map.used_regions
+    assert dump_map(smu) == dump_map(sm)
+    assert dump_map(smu) != dump_map(process_map_file(filename))
+    root = smu.memory_map.root
+    for node in root.children:
+        assert root.get_child_by_ident(node.ident) is node
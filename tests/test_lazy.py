@@ -0,0 +1,41 @@
+
+
+import pytest
+
+from fpvgcc.cli import main
+from fpvgcc.fpv import process_map_file
+from fpvgcc.lazy import process_map_file_lazy
+from .vectors import EXAMPLE_FILES
+from .vectors import dump_nodes
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_lazy_get_node(filename):
+    sm = process_map_file(filename)
+    sml = process_map_file_lazy(filename)
+    pending = len(sml.memory_map.pending)
+    node = sml.memory_map.get_node('.text')
+    assert 0 < len(sml.memory_map.pending) < pending
+    assert dump_nodes(node.all_nodes()) == \
+        dump_nodes(sm.memory_map.get_node('.text').all_nodes())
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_lazy_all_nodes(filename):
+    sm = process_map_file(filename)
+    sml = process_map_file_lazy(filename)
+    sml.memory_map.get_node('.text')
+    assert dump_nodes(sml.memory_map.root.all_nodes()) == \
+        dump_nodes(sm.memory_map.root.all_nodes())
+    assert not sml.memory_map.pending
+    assert sml.loaded_files == sm.loaded_files
+    assert sml.memory_map.used_regions == sm.memory_map.used_regions
+
+
+@pytest.mark.parametrize('option', [['--mmap'], ['-j', '2'],
+                                    ['--cache', 'cache']])
+def test_lazy_cli_exclusive(option, capsys):
+    with pytest.raises(SystemExit):
+        main(['tests/maps/example.msp430-elf.0.map', '--lazy', '--sar'] +
+             option)
+    assert 'not allowed with argument ' + option[0] in capsys.readouterr().err
@@ -0,0 +1,129 @@
+
+
+import pytest
+
+from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.gccMemoryMap import GCCMemoryMapNode
+
+
+def test_child_disambig():
+    mm = GCCMemoryMap(None)
+    text = mm.get_node('.text', create=True)
+    assert text.get_child_disambig('main_o') is None
+    mm.get_node('.text.main_o', create=True)
+    assert text.get_child_disambig('main_o') is None
+    assert text.get_child_disambig('main_o', prospective=True) == 0
+    mm.get_node('.text.main_o:1', create=True)
+    mm.get_node('.text.main_o:3', create=True)
+    assert mm.get_node_disambig('.text.main_o', prospective=True) == 3
+    text.remove_child(text.get_child_by_ident('main_o:3'))
+    assert text.get_child_disambig('main_o') == 1
+    node = text.get_child_by_ident('main_o:1')
+    node.ident = 'util_o:2'
+    assert text.get_child_disambig('main_o') is None
+    assert text.get_child_disambig('util_o') == 2
+
+
+def test_child_index():
+    mm = GCCMemoryMap(None)
+    for name in ('b', 'a', 'c'):
+        mm.get_node('.text.' + name, create=True)
+    text = mm.get_node('.text')
+    assert [x.ident for x in text.children] == ['b', 'a', 'c']
+    node = text.get_child_by_ident('a')
+    node.ident = 'd'
+    assert text.get_child_by_ident('d') is node
+    with pytest.raises(ValueError):
+        text.get_child_by_ident('a')
+    with pytest.raises(ValueError):
+        text.add_child(name='c')
+    text.remove_child(node)
+    assert [x.ident for x in text.children] == ['b', 'c']
+    assert mm.get_node('.text.d', create=True) is not node
+
+
+def test_gident_invalidation():
+    mm = GCCMemoryMap(None)
+    leaf = mm.get_node('.text.main_o.main', create=True)
+    assert leaf.gident == '.text.main_o.main'
+    leaf.parent.ident = 'util_o'
+    assert leaf.gident == '.text.util_o.main'
+    other = mm.get_node('.data', create=True)
+    moved = leaf.parent
+    mm.get_node('.text').remove_child(moved)
+    other.add_child(moved)
+    assert leaf.gident == '.data.util_o.main'
+
+
+def test_all_nodes_after_change():
+    mm = GCCMemoryMap(None)
+    mm.get_node('.text.a', create=True)
+    nodes = mm.root.all_nodes()
+    assert mm.root.all_nodes() is nodes
+    generation = mm.generation
+    mm.get_node('.text.b', create=True)
+    assert mm.generation > generation
+    assert [n.gident for n in mm.root.all_nodes()] == \
+        ['', '.text', '.text.a', '.text.b']
+    assert [n.gident for n in mm.get_node('.text').all_nodes()] == \
+        ['.text', '.text.a', '.text.b']
+
+
+def test_size_invalidation():
+    mm = GCCMemoryMap(None)
+    a = mm.get_node('.text.a', create=True)
+    a.osize = '0x10'
+    b = mm.get_node('.text.b', create=True)
+    b.osize = '0x20'
+    assert mm.get_node('.text').size == 0x30
+    assert mm.root.size == 0x30
+    b.fillsize = 2
+    assert mm.root.size == 0x32
+    c = mm.get_node('.text.c', create=True)
+    assert mm.root.size == 0x32
+    c.osize = '0x4'
+    assert mm.root.size == 0x36
+
+
+def test_node_slots():
+    mm = GCCMemoryMap(None)
+    node = mm.get_node('.text.main_o', create=True)
+    assert not hasattr(node, '__dict__')
+    assert node.tree is mm
+    assert node.node_t is GCCMemoryMap.node_t
+    assert node.region == 'UNDEF'
+    assert mm.region_names == ['UNDEF']
+
+
+def test_node_tree():
+    mm = GCCMemoryMap(None)
+    assert mm.root.tree is mm
+    detached = GCCMemoryMapNode(name='data')
+    child = detached.add_child(name='main_o')
+    assert detached.tree is None
+    assert child.tree is None
+    assert child.node_t is GCCMemoryMapNode
+    mm.root.add_child(detached)
+    assert detached.tree is mm
+    assert child.tree is mm
+    assert mm.get_node('.data.main_o') is child
+    assert mm.get_node('.data.extra', create=True).tree is mm
+
+
+def test_file_name_encoding():
+    mm = GCCMemoryMap(None)
+    node = mm.get_node('.text.main_o', create=True)
+    node.objfile = 'main.o'
+    node.arfile = None
+    assert node._objfile == mm.strings.id('main.o')
+    assert node._arfile == 0
+    assert node.objfile == 'main.o'
+    assert node.arfile is None
+
+    other = GCCMemoryMap(None)
+    other.strings.intern('unrelated.o')
+    mm.get_node('.text').remove_child(node)
+    other.get_node('.text', create=True).add_child(node)
+    assert node._objfile == other.strings.id('main.o')
+    assert node.objfile == 'main.o'
+    assert other.symbols_from_file('main.o') == ['main_o']
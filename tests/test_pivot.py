@@ -0,0 +1,71 @@
+import pytest
+
+from fpvgcc.fpv import process_map_file
+from .vectors import EXAMPLE_FILES
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_pivot_footprints(filename):
+    mm = process_map_file(filename).memory_map
+    regions = mm.used_regions
+    sections = mm.used_sections
+    pivots = mm.pivots
+    assert pivots.complete
+    for objfile in mm.used_objfiles:
+        assert pivots.objfile_fp(objfile, regions) == \
+            [mm.get_objfile_fp_rgn(objfile, x) for x in regions]
+        assert pivots.objfile_fp_secs(objfile, sections) == \
+            [mm.get_objfile_fp_sec(objfile, x) for x in sections]
+    for arfile in mm.used_arfiles:
+        assert pivots.arfile_fp(arfile, regions) == \
+            [mm.get_arfile_fp_rgn(arfile, x) for x in regions]
+        assert pivots.arfile_fp_secs(arfile, sections) == \
+            [mm.get_arfile_fp_sec(arfile, x) for x in sections]
+    for symbol in mm.all_symbols:
+        assert pivots.symbol_fp(symbol, regions) == \
+            [mm.get_symbol_fp_rgn(symbol, x) for x in regions]
+    assert pivots.objfile_fp('missing.o', regions) == [0] * len(regions)
+
+
+def test_pivot_rebuild():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map').memory_map
+    pivots = mm.pivots
+    assert mm.pivots is pivots
+    mm.get_node('.text.extra', create=True)
+    assert mm.pivots is not pivots
+
+
+def test_used_lists_cached():
+    mm = process_map_file('tests/maps/example.msp430-elf.0.map').memory_map
+    sections = mm.used_sections
+    regions = mm.used_regions
+    assert mm.used_sections is sections
+    assert mm.used_regions is regions
+    mm.collapse_vectors = False
+    assert '.*vec*' in sections
+    assert '.*vec*' not in mm.used_sections
+    mm.collapse_vectors = True
+    assert mm.used_sections == sections
+    sections = mm.used_sections
+    assert mm.used_sections is sections
+    mm.get_node('.text.extra', create=True)
+    assert mm.used_sections is not sections
+    assert mm.used_sections == sections
+    assert mm.used_regions is not regions
+    assert mm.used_regions == regions
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_pivot_nested_sections(filename):
+    mm = process_map_file(filename).memory_map
+    mm.used_sections
+    sections = [n.gident for n in mm.root.all_nodes()[1:]
+                if n.children and n.size]
+    for objfile in mm.used_objfiles:
+        assert mm.get_objfile_fp_secs(objfile, sections) == \
+            [mm.get_objfile_fp_sec(objfile, x) for x in sections]
+    for arfile in mm.used_arfiles:
+        assert mm.get_arfile_fp_secs(arfile, sections) == \
+            [mm.get_arfile_fp_sec(arfile, x) for x in sections]
+    with pytest.raises(ValueError):
+        mm.get_objfile_fp_secs(mm.used_objfiles[0], ['.missing'])
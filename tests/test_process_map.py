@@ -1,7 +1,18 @@
 
 
+import logging
+import os
+
+import pytest
+
+from fpvgcc import parallel
 from fpvgcc.fpv import GCCMemoryMapParserSM
+from fpvgcc.fpv import process_linkermap_line
+from fpvgcc.fpv import process_map_file
 from fpvgcc.gccMemoryMap import GCCMemoryMap
+from fpvgcc.parallel import process_map_file_parallel
+from .vectors import EXAMPLE_FILES
+from .vectors import dump_map
 from .vectors import example_map
 
 
@@ -9,3 +20,80 @@ def test_process_map(example_map):
     mm, vectors = example_map
     assert isinstance(mm, GCCMemoryMapParserSM)
     assert isinstance(mm.memory_map, GCCMemoryMap)
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_process_map_mmap(filename):
+    sm = process_map_file(filename)
+    smb = process_map_file(filename, use_mmap=True)
+    assert smb.loaded_files == sm.loaded_files
+    assert dump_map(smb) == dump_map(sm)
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+def test_process_map_parallel(filename, monkeypatch):
+    assert process_map_file_parallel(filename, None, 2) is None
+    monkeypatch.setattr(parallel, 'parallel_min_size', 0)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 2)
+    sm = process_map_file(filename)
+    smp = process_map_file_parallel(filename, sm.ctx, 2)
+    assert smp is not None
+    assert smp.loaded_files == sm.loaded_files
+    assert smp.memory_map.aliases.items() == sm.memory_map.aliases.items()
+    assert dump_map(smp) == dump_map(sm)
+
+
+# Lines outside of output sections, with the messages logged for them by
+# the original (undispatched) parser.
+_normal_lines = [
+    ('                0x00000000000049e8                . = ALIGN (0x2)',
+     ['0x00000000000049e8                . = ALIGN (0x2)']),
+    ('                0x0000000000004400                VECTOR_ISR = .',
+     ['0x0000000000004400                VECTOR_ISR = .']),
+    ('                0x0000000008000000                g_pfnVectors', []),
+    ('                0x0000000000004400                __stack', []),
+    ('                0x0000000000004400        0x10 crt0.o',
+     ['0x0000000000004400        0x10 crt0.o']),
+    ('                0x0000000000004400        0x10',
+     ['0x0000000000004400        0x10'] * 2),
+    (' .text          0x0000000000004400        0x10 crt0.o',
+     ['.text          0x0000000000004400        0x10 crt0.o']),
+    (' *fill*         0x0000000000004410        0x2 ',
+     ['*fill*         0x0000000000004410        0x2']),
+    (' .text.main', ['.text.main']),
+    ('START GROUP', []),
+]
+
+
+@pytest.mark.parametrize('line, expected', _normal_lines)
+def test_unhandled_normal_lines(caplog, line, expected):
+    caplog.set_level(logging.WARNING)
+    sm = GCCMemoryMapParserSM(None)
+    sm.LINKERMAP_STATE = 'NORMAL'
+    process_linkermap_line(line + '\n', sm)
+    assert [r.getMessage() for r in caplog.records] == \
+        ['Unhandled line in linkerm : ' + x for x in expected]
+
+
+# Number of unhandled lines logged by the original parser for each map,
+# (outside of sections, within sections).
+_unhandled_counts = {
+    'example.arm-none-eabi.basic.0.map': (0, 78),
+    'example.msp430-elf.0.map': (0, 768),
+    'example.msp430-elf.basic.0.map': (0, 768),
+}
+
+
+@pytest.mark.parametrize('filename', EXAMPLE_FILES.keys())
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_unhandled_lines(caplog, filename, use_mmap):
+    caplog.set_level(logging.WARNING)
+    process_map_file(filename, use_mmap=use_mmap)
+    messages = [r.getMessage() for r in caplog.records]
+    counts = (
+        len([m for m in messages
+             if m.startswith('Unhandled line in linkerm')]),
+        len([m for m in messages
+             if m.startswith('Unhandled line in section')]),
+    )
+    assert counts == _unhandled_counts[os.path.basename(filename)]
@@ -17,3 +17,12 @@ def example_map(request):
     filename = request.param
     vectors = EXAMPLE_FILES[filename]
     return process_map_file(filename, profile='auto'), vectors
+
+
+def dump_nodes(nodes):
+    return [(n.gident, n.address, n.leafsize, n.fillsize, n.objfile,
+             n.arfile, n.arfolder) for n in nodes]
+
+
+def dump_map(sm):
+    return dump_nodes(sm.memory_map.root.all_nodes())